@@ -1,4 +1,9 @@
 # gunicorn_config.py
 bind = "0.0.0.0:80"  # O Render espera que a porta seja 80 ou 10000
 workers = 3          # Número de processos de trabalho
+# As rotas de arquivos são praticamente só I/O (MongoDB/GridFS). Com workers
+# "gthread", cada processo atende várias requisições ao mesmo tempo: enquanto
+# uma thread espera o banco, as outras continuam servindo downloads e listagens.
+worker_class = "gthread"
+threads = 8          # Threads por worker (compartilham o pool do MongoClient)
 timeout = 120        # Aumenta o timeout para lidar com requisições de IA mais longas
\ No newline at end of file
@@ -20,7 +20,9 @@ from flask_swagger_ui import get_swaggerui_blueprint
 
 from src.config import Config
 from src.db.mongo import init_db
+from src.db.cache import init_cache
 from src.utils.observability import setup_logging
+from src.utils.json_provider import OrjsonProvider
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +31,12 @@ def create_app():
     
     app = Flask(__name__)
     app.config.from_object(Config)
+    # O Werkzeug aplica o limite ao ler o corpo (inclusive uploads sem
+    # Content-Length ou chunked) e responde 413 em vez de consumir tudo.
+    app.config["MAX_CONTENT_LENGTH"] = Config.MAX_UPLOAD_BYTES
+
+    # Serialização JSON em C (orjson), com suporte nativo a ObjectId.
+    app.json = OrjsonProvider(app)
 
     # Configura o logging estruturado para toda a aplicação.
     setup_logging()
@@ -44,6 +52,9 @@ def create_app():
     with app.app_context():
         # Inicializa a conexão com o banco de dados MongoDB e GridFS.
         init_db(app)
+
+        # Inicializa o cache de listagens em Redis (opcional, via REDIS_URL).
+        init_cache(app)
         
         # --- LÓGICA DE INICIALIZAÇÃO REMOVIDA ---
         # A inicialização do AgentManager, do memory_manager e dos agentes do CrewAI
@@ -13,11 +13,13 @@ auth_bp = Blueprint('auth_bp', __name__)
 # Configura o passlib para hashing de senhas (sem alterações aqui)
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Expressão regular de email, compilada uma única vez na importação
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
 # Função auxiliar para validar o formato do email
 def is_valid_email(email):
     """Verifica se o formato do email é válido usando uma expressão regular simples."""
-    regex = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(regex, email) is not None
+    return _EMAIL_RE.match(email) is not None
 
 @auth_bp.route('/register', methods=['POST'])
 def register():
@@ -40,7 +42,7 @@ def register():
     users_collection = db.users
 
     # MUDANÇA: Verificar a existência do usuário pelo email
-    if users_collection.find_one({"email": email}):
+    if users_collection.find_one({"email": email}, {"_id": 1}):
         return jsonify({"erro": "Este email já está em uso"}), 409
 
     hashed_password = pwd_context.hash(password)
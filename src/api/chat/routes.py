@@ -5,13 +5,15 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
 from bson.errors import InvalidId
 from datetime import datetime, timedelta
+import threading
+from cachetools import TTLCache
 from src.db.mongo import get_db, get_gridfs
+from src.db.cache import invalidate_documents
 from src.tasks.ia_processor import processar_solicitacao_ia
 
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from src.tasks.llm_fallback import FallbackLLM
-from src.config import Config
 
 chat_bp = Blueprint('chat_bp', __name__)
 
@@ -22,6 +24,11 @@ except Exception as e:
     # Se falhar, definimos como None para que possamos lidar com o erro graciosamente.
     title_generation_llm = None
 
+# Primeiras mensagens se repetem muito ("oi", "bom dia", "quais templates?").
+# Guardamos o título gerado por prompt (normalizado) para não chamar o LLM de novo.
+_title_cache = TTLCache(maxsize=1024, ttl=3600)
+_title_cache_lock = threading.Lock()
+
 def generate_conversation_title(first_prompt: str) -> str:
     """
     Usa um LLM para gerar um título curto e descritivo.
@@ -31,6 +38,12 @@ def generate_conversation_title(first_prompt: str) -> str:
         # Pega as primeiras 5 palavras do prompt como um fallback simples.
         return " ".join(first_prompt.split()[:5]) + "..."
 
+    cache_key = " ".join(first_prompt.lower().split())
+    with _title_cache_lock:
+        cached_title = _title_cache.get(cache_key)
+    if cached_title:
+        return cached_title
+
     try:
         # Prompt otimizado para a tarefa de criar títulos.
         prompt = ChatPromptTemplate.from_template(
@@ -70,7 +83,12 @@ def generate_conversation_title(first_prompt: str) -> str:
         if len(title) > 70:
             title = title[:67] + "..."
 
-        return title if title else "Novo Chat"
+        if not title:
+            return "Novo Chat"
+
+        with _title_cache_lock:
+            _title_cache[cache_key] = title
+        return title
         
     except Exception:
         # Em caso de qualquer erro com a IA, retorna um título de fallback.
@@ -140,7 +158,7 @@ def send_message():
             conv = db.conversations.find_one({
                 "_id": conversation_id, 
                 "user_id": ObjectId(current_user_id)
-            })
+            }, {"_id": 1})
             if not conv:
                 return jsonify({"erro": "Conversa não encontrada ou acesso negado"}), 404
         except InvalidId:
@@ -181,7 +199,7 @@ def send_message():
             doc_check = db.documents.find_one({
                 "_id": doc_id,
                 "owner_id": ObjectId(current_user_id)
-            })
+            }, {"_id": 1})
             if not doc_check:
                 return jsonify({"erro": "Documento anexado não encontrado"}), 404
             user_message["input_document_id"] = doc_id
@@ -228,15 +246,12 @@ def get_conversations():
         {
             "user_id": ObjectId(current_user_id),
             "is_empty": {"$ne": True} # Não lista rascunhos vazios
-        }
+        },
+        {"is_empty": 0} # A flag de rascunho é interna e não vai para o cliente
     ).sort("last_updated_at", -1)
     
-    conversations = []
-    for conv in convs_cursor:
-        conv['_id'] = str(conv['_id'])
-        conv['user_id'] = str(conv['user_id'])
-        conv.pop('is_empty', None)
-        conversations.append(conv)
+    # ObjectIds são convertidos para string pelo provider JSON da aplicação.
+    conversations = list(convs_cursor)
         
     return jsonify(conversations)
 
@@ -256,7 +271,7 @@ def get_conversation_history(conversation_id_str):
     conv = db.conversations.find_one({
         "_id": conversation_id, 
         "user_id": ObjectId(current_user_id)
-    })
+    }, {"_id": 1})
     if not conv:
         return jsonify({"erro": "Conversa não encontrada ou acesso negado"}), 404
     
@@ -265,15 +280,8 @@ def get_conversation_history(conversation_id_str):
         {"conversation_id": conversation_id}
     ).sort("timestamp", 1)
     
-    messages = []
-    for msg in msgs_cursor:
-        # Itera sobre todas as chaves e valores do documento da mensagem
-        for key, value in msg.items():
-            # Se o valor for do tipo ObjectId, converte para string
-            if isinstance(value, ObjectId):
-                msg[key] = str(value)
-        
-        messages.append(msg)
+    # ObjectIds são convertidos para string pelo provider JSON da aplicação.
+    messages = list(msgs_cursor)
         
     return jsonify(messages)
 
@@ -290,13 +298,16 @@ def delete_conversation(conversation_id):
     conversation_to_delete = db.conversations.find_one({
         "_id": conv_oid,
         "user_id": ObjectId(current_user_id)
-    })
+    }, {"_id": 1})
     if not conversation_to_delete:
         return jsonify({"erro": "Conversa não encontrada ou acesso negado"}), 404
 
     # --- NOVA LÓGICA DE LIMPEZA DE ARQUIVOS ---
     # 2. Encontrar todos os documentos associados a esta conversa
-    messages_in_conv = db.messages.find({"conversation_id": conv_oid})
+    messages_in_conv = db.messages.find(
+        {"conversation_id": conv_oid},
+        {"generated_document_id": 1, "input_document_id": 1}
+    )
     document_ids_to_delete = []
     for msg in messages_in_conv:
         if msg.get("generated_document_id"):
@@ -316,6 +327,7 @@ def delete_conversation(conversation_id):
         
         # Deleta os metadados
         db.documents.delete_many({"_id": {"$in": unique_doc_ids}})
+        invalidate_documents(current_user_id)
         
         # Deleta os arquivos no GridFS
         for gridfs_id in gridfs_ids_to_delete:
@@ -389,7 +401,10 @@ def edit_message(message_id):
     msg_oid = ObjectId(message_id)
 
     # 1. Encontrar a mensagem original para garantir a permissão
-    original_message = db.messages.find_one({"_id": msg_oid, "user_id": ObjectId(current_user_id)})
+    original_message = db.messages.find_one(
+        {"_id": msg_oid, "user_id": ObjectId(current_user_id)},
+        {"role": 1, "conversation_id": 1, "timestamp": 1}
+    )
     if not original_message or original_message.get("role") != "user":
         return jsonify({"erro": "Mensagem não encontrada, não pertence ao usuário ou não é um prompt de usuário."}), 404
     
@@ -416,7 +431,10 @@ def regenerate_message(message_id):
     db = get_db()
     msg_oid = ObjectId(message_id)
 
-    original_message = db.messages.find_one({"_id": msg_oid, "user_id": ObjectId(current_user_id)})
+    original_message = db.messages.find_one(
+        {"_id": msg_oid, "user_id": ObjectId(current_user_id)},
+        {"role": 1, "conversation_id": 1, "timestamp": 1}
+    )
     if not original_message or original_message.get("role") != "user":
         return jsonify({"erro": "Mensagem não encontrada, não pertence ao usuário ou não é um prompt de usuário."}), 404
 
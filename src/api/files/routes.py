@@ -3,22 +3,28 @@
 from flask import Blueprint, request, jsonify, send_file, Response, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from bson import ObjectId
-from bson.errors import InvalidId
 from datetime import datetime
 from gridfs.errors import NoFile
+from werkzeug.exceptions import RequestEntityTooLarge
 from src.db.mongo import get_db, get_gridfs
+from src.db.cache import documents_page_key, get_cached, set_cached, invalidate_documents
+from src.tasks.tools import invalidate_template_list
 import io
 import re
 import mimetypes
 import math
 
+# Formato de um ObjectId em texto: 24 caracteres hexadecimais. Validar antes
+# evita lançar/capturar exceções do construtor a cada ID inválido recebido.
+_HEX24 = re.compile(r"[0-9a-fA-F]{24}")
+
 def _to_objectid_or_none(val):
     if isinstance(val, ObjectId):
         return val
-    try:
-        return ObjectId(str(val))
-    except Exception:
+    s = val if isinstance(val, str) else str(val)
+    if not _HEX24.fullmatch(s):
         return None
+    return ObjectId(s)
 
 def _guess_mimetype(filename: str):
     if not filename:
@@ -35,9 +41,46 @@ def _guess_mimetype(filename: str):
         return "application/pdf"
     return "application/octet-stream"
 
+# Extensões aceitas no upload (as mesmas que o file_reader_tool sabe ler)
+ALLOWED_DOCUMENT_EXTENSIONS = {"docx", "xlsx", "xls", "pdf", "txt", "csv", "json"}
+ALLOWED_TEMPLATE_EXTENSIONS = {"docx"}
+
+# Content-Types que nunca correspondem a um documento aceito (a extensão é
+# validada à parte). Só recusamos um tipo declarado que contradiz o arquivo: parte
+# sem Content-Type (comum em scripts), 'application/octet-stream' e variantes de
+# navegador ('text/x-csv', 'application/x-zip-compressed'...) continuam aceitas.
+_INCOMPATIBLE_CONTENT_TYPE_PREFIXES = ("image/", "audio/", "video/", "font/")
+_INCOMPATIBLE_CONTENT_TYPES = {
+    "text/html",
+    "text/javascript",
+    "application/javascript",
+    "application/x-msdownload",
+    "application/x-sh",
+}
+
+def _extension_error(filename, allowed_extensions):
+    """Retorna uma resposta 415 se a extensão não for permitida; caso contrário, None."""
+    ext = filename.rpartition('.')[2].lower()
+    if ext not in allowed_extensions:
+        permitidas = ", ".join(sorted(allowed_extensions))
+        return jsonify({"erro": f"Tipo de arquivo não suportado. Extensões permitidas: {permitidas}"}), 415
+    return None
+
+def _content_type_error(file):
+    """Retorna uma resposta 415 se o Content-Type declarado contradiz o arquivo; caso contrário, None."""
+    mimetype = (file.mimetype or "").lower()
+    if mimetype in _INCOMPATIBLE_CONTENT_TYPES or mimetype.startswith(_INCOMPATIBLE_CONTENT_TYPE_PREFIXES):
+        return jsonify({"erro": f"Content-Type não suportado: {mimetype}"}), 415
+    return None
+
 # Cria o Blueprint para as rotas de arquivos
 files_bp = Blueprint('files_bp', __name__)
 
+@files_bp.errorhandler(RequestEntityTooLarge)
+def _handle_upload_too_large(e):
+    # Levantada pelo Werkzeug ao ler um corpo maior que MAX_CONTENT_LENGTH.
+    return jsonify({"erro": "Arquivo excede o tamanho máximo permitido"}), 413
+
 @files_bp.route('/documents/upload', methods=['POST'])
 @jwt_required()
 def upload_document():
@@ -49,10 +92,14 @@ def upload_document():
     file = request.files['file']
     if file.filename == '':
         return jsonify({"erro": "Nome de arquivo vazio"}), 400
-    
-    ## SUGESTÃO (Segurança): Considere validar a extensão ou o tipo MIME do arquivo
-    ## para permitir apenas formatos esperados (ex: 'pdf', 'docx', 'png'), 
-    ## prevenindo o upload de arquivos potencialmente maliciosos.
+
+    # Rejeita extensões e Content-Types inesperados antes de iniciar a escrita no GridFS.
+    extension_error = _extension_error(file.filename, ALLOWED_DOCUMENT_EXTENSIONS)
+    if extension_error:
+        return extension_error
+    content_type_error = _content_type_error(file)
+    if content_type_error:
+        return content_type_error
 
     db = get_db()
     fs = get_gridfs()
@@ -66,6 +113,7 @@ def upload_document():
         "created_at": datetime.utcnow()
     }
     result = db.documents.insert_one(document_meta)
+    invalidate_documents(current_user_id)
 
     ## MELHORIA (Consistência da API): Retorne o objeto de metadado criado.
     # Isso fornece ao cliente o 'document_id' (_id) imediatamente, que é necessário
@@ -95,6 +143,13 @@ def upload_template():
     file = request.files['file']
     if file.filename == '':
         return jsonify({"erro": "Nome de arquivo vazio"}), 400
+
+    extension_error = _extension_error(file.filename, ALLOWED_TEMPLATE_EXTENSIONS)
+    if extension_error:
+        return extension_error
+    content_type_error = _content_type_error(file)
+    if content_type_error:
+        return content_type_error
         
     db = get_db()
     fs = get_gridfs()
@@ -108,6 +163,7 @@ def upload_template():
         "created_at": datetime.utcnow()
     }
     db.templates.insert_one(template_meta)
+    invalidate_template_list()
     
     return jsonify({
         "mensagem": "Template enviado com sucesso!",
@@ -232,6 +288,13 @@ def list_documents():
     if page < 1 or limit < 1:
         return jsonify({"erro": "Parâmetros 'page' e 'limit' devem ser maiores que zero"}), 400
         
+    # A primeira página é a mais acessada: tenta servi-la direto do cache.
+    cache_key = documents_page_key(current_user_id, page, limit) if page == 1 else None
+    if cache_key:
+        cached = get_cached(cache_key)
+        if cached:
+            return Response(cached, mimetype='application/json')
+
     # Calcula quantos documentos pular
     skip = (page - 1) * limit
     
@@ -245,16 +308,12 @@ def list_documents():
     docs_cursor = db.documents.find(query_filter).sort("created_at", -1).skip(skip).limit(limit)
     # --- FIM DA LÓGICA DE PAGINAÇÃO ---
 
-    documents_list = []
-    for doc in docs_cursor:
-        doc['_id'] = str(doc['_id'])
-        doc['owner_id'] = str(doc['owner_id'])
-        doc['gridfs_file_id'] = str(doc['gridfs_file_id'])
-        documents_list.append(doc)
+    # ObjectIds são convertidos para string pelo provider JSON da aplicação.
+    documents_list = list(docs_cursor)
         
     # --- NOVA ESTRUTURA DE RESPOSTA ---
     # A resposta agora é um objeto que contém os dados e as informações de paginação
-    return jsonify({
+    response = jsonify({
         "data": documents_list,
         "pagination": {
             "total_items": total_documents,
@@ -263,6 +322,9 @@ def list_documents():
             "items_per_page": limit
         }
     })
+    if cache_key:
+        set_cached(cache_key, response.get_data())
+    return response
 
 @files_bp.route('/documents/<string:document_id>', methods=['DELETE'])
 @jwt_required()
@@ -271,9 +333,8 @@ def delete_document(document_id):
     db = get_db()
     fs = get_gridfs()
 
-    try:
-        doc_oid = ObjectId(document_id)
-    except InvalidId:
+    doc_oid = _to_objectid_or_none(document_id)
+    if not doc_oid:
         return jsonify({"erro": "ID de documento inválido"}), 400
 
     doc_meta = db.documents.find_one_and_delete({
@@ -283,6 +344,7 @@ def delete_document(document_id):
 
     if not doc_meta:
         return jsonify({"erro": "Documento não encontrado ou acesso negado"}), 404
+    invalidate_documents(current_user_id)
 
     ## OBSERVAÇÃO (Robustez): Se a operação a seguir falhar, o arquivo
     ## no GridFS ficará "órfão". Para sistemas críticos, considere adicionar
@@ -334,12 +396,8 @@ def search_documents():
     # A busca continua a mesma, mas agora usa o novo 'query_filter' otimizado
     docs_cursor = db.documents.find(query_filter).sort("created_at", -1).skip(skip).limit(limit)
 
-    documents_list = []
-    for doc in docs_cursor:
-        doc['_id'] = str(doc['_id'])
-        doc['owner_id'] = str(doc['owner_id'])
-        doc['gridfs_file_id'] = str(doc['gridfs_file_id'])
-        documents_list.append(doc)
+    # ObjectIds são convertidos para string pelo provider JSON da aplicação.
+    documents_list = list(docs_cursor)
         
     # --- NOVA ESTRUTURA DE RESPOSTA ---
     return jsonify({
@@ -364,17 +422,20 @@ def rename_document(document_id):
 
     db = get_db()
     
-    try:
-        doc_oid = ObjectId(document_id)
-    except InvalidId:
+    doc_oid = _to_objectid_or_none(document_id)
+    if not doc_oid:
         return jsonify({"erro": "ID de documento inválido"}), 400
 
-    doc_meta = db.documents.find_one({"_id": doc_oid, "owner_id": ObjectId(current_user_id)})
+    # Busca e atualiza o metadado em uma única ida ao banco, trazendo de volta
+    # apenas o campo necessário para renomear também o arquivo no GridFS.
+    doc_meta = db.documents.find_one_and_update(
+        {"_id": doc_oid, "owner_id": ObjectId(current_user_id)},
+        {"$set": {"filename": new_filename}},
+        projection={"gridfs_file_id": 1},
+    )
     if not doc_meta:
         return jsonify({"erro": "Documento não encontrado ou acesso negado"}), 404
-
-    # Atualiza o metadado na coleção 'documents'
-    db.documents.update_one({"_id": doc_oid}, {"$set": {"filename": new_filename}})
+    invalidate_documents(current_user_id)
     
     ## OBSERVAÇÃO (Robustez): Assim como no delete, esta é uma segunda operação de escrita.
     ## Se ela falhar, os nomes ficarão inconsistentes entre a sua coleção e a do GridFS.
@@ -411,12 +472,8 @@ def list_templates():
     templates_cursor = db.templates.find(query_filter).sort("filename", 1).skip(skip).limit(limit)
     # --- FIM DA LÓGICA DE PAGINAÇÃO ---
 
-    templates_list = []
-    for t in templates_cursor:
-        t['_id'] = str(t['_id'])
-        t['uploaded_by'] = str(t['uploaded_by'])
-        t['gridfs_file_id'] = str(t['gridfs_file_id'])
-        templates_list.append(t)
+    # ObjectIds são convertidos para string pelo provider JSON da aplicação.
+    templates_list = list(templates_cursor)
         
     # --- NOVA ESTRUTURA DE RESPOSTA ---
     return jsonify({
@@ -11,8 +11,26 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY')
     MONGO_URI = os.environ.get('MONGO_URI')
     MONGO_DB_NAME = os.environ.get('MONGO_DB_NAME')
+    # Pool de conexões do MongoClient (ajustável por deploy)
+    MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 100))
+    MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 10))
+    MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 300_000))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 10_000))
+    MONGO_COMPRESSORS = os.environ.get('MONGO_COMPRESSORS', 'zstd,zlib')
+    REDIS_URL = os.environ.get('REDIS_URL')
+    DOCUMENTS_CACHE_TTL = int(os.environ.get('DOCUMENTS_CACHE_TTL', 60))
     GOOGLE_API_KEY = os.environ.get('GOOGLE_API_KEY')
+    # Máximo de chamadas simultâneas ao Gemini por processo (respeita o rate limit)
+    LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 8))
+    # Tempo máximo (s) de cada chamada ao Gemini antes de desistir do modelo
+    LLM_TIMEOUT_SECONDS = float(os.environ.get('LLM_TIMEOUT_SECONDS', 60))
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(days=1)
+    MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 25 * 1024 * 1024))
+    # Quantidade máxima de mensagens do histórico enviadas ao grafo de IA
+    HISTORY_MAX_MESSAGES = int(os.environ.get('HISTORY_MAX_MESSAGES', 20))
+    # Máximo de caracteres do documento anexado enviados ao LLM na leitura
+    DOCUMENT_CONTEXT_MAX_CHARS = int(os.environ.get('DOCUMENT_CONTEXT_MAX_CHARS', 15000))
     LLM_MODEL_LIST = [
         model.strip() for model in 
         os.environ.get('LLM_MODEL_LIST','gemini-2.5-flash-lite, gemini-2.5-flash, gemini-2.5-pro').split(',')
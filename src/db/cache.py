@@ -0,0 +1,75 @@
+# Arquivo: src/db/cache.py
+
+"""
+Cache em Redis para respostas de listagem muito acessadas.
+
+A primeira página de `/documents` é consultada o tempo todo (dashboards, polling).
+Guardamos o JSON já serializado em uma chave que inclui a "geração" do usuário;
+qualquer escrita nos documentos dele incrementa essa geração, invalidando de uma
+vez todas as páginas em cache sem precisar apagá-las (elas expiram pelo TTL).
+
+O cache é opcional: sem `REDIS_URL` configurada, ou se o Redis estiver fora do ar,
+as funções abaixo simplesmente não fazem nada e as rotas consultam o MongoDB.
+"""
+
+import logging
+import redis
+
+logger = logging.getLogger(__name__)
+
+# Variáveis globais para o cliente Redis e o TTL das entradas
+redis_client = None
+cache_ttl = 60
+
+def init_cache(app):
+    """Inicializa o cliente Redis, se a variável REDIS_URL estiver definida."""
+    global redis_client, cache_ttl
+
+    redis_url = app.config.get('REDIS_URL')
+    if not redis_url:
+        logger.info("REDIS_URL não definida. Cache de listagens desativado.")
+        return
+
+    cache_ttl = app.config.get('DOCUMENTS_CACHE_TTL', cache_ttl)
+    # Timeouts curtos: um Redis lento não pode ficar mais caro que o próprio MongoDB.
+    redis_client = redis.Redis.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+def documents_page_key(owner_id, page: int, limit: int):
+    """
+    Monta a chave de cache de uma página de documentos, já com a geração atual
+    do usuário. Deve ser obtida ANTES da consulta ao MongoDB, para que uma escrita
+    concorrente nunca faça dados antigos serem gravados sob a geração nova.
+    Retorna None se o cache estiver desativado ou indisponível.
+    """
+    if redis_client is None:
+        return None
+    try:
+        generation = redis_client.get(f"gen:{owner_id}") or b"0"
+    except redis.RedisError as e:
+        logger.warning("Falha ao ler a geração do cache de documentos: %s", e)
+        return None
+    return f"docs:{owner_id}:{generation.decode()}:{page}:{limit}"
+
+def get_cached(key: str):
+    """Retorna o JSON (bytes) armazenado na chave, ou None."""
+    try:
+        return redis_client.get(key)
+    except redis.RedisError as e:
+        logger.warning("Falha ao ler o cache: %s", e)
+        return None
+
+def set_cached(key: str, payload: bytes):
+    """Armazena o JSON serializado na chave, com o TTL configurado."""
+    try:
+        redis_client.setex(key, cache_ttl, payload)
+    except redis.RedisError as e:
+        logger.warning("Falha ao gravar o cache: %s", e)
+
+def invalidate_documents(owner_id):
+    """Incrementa a geração do usuário, invalidando todas as páginas em cache."""
+    if redis_client is None:
+        return
+    try:
+        redis_client.incr(f"gen:{owner_id}")
+    except redis.RedisError as e:
+        logger.warning("Falha ao invalidar o cache de documentos: %s", e)
@@ -1,5 +1,9 @@
 # Arquivo: src/db/mongo.py
 
+import atexit
+import os
+import threading
+
 from pymongo import MongoClient
 from gridfs import GridFS
 
@@ -8,11 +12,47 @@ mongo_client = None
 db = None
 fs = None
 
+# Garante um único MongoClient por processo. O PID de quem criou o cliente é
+# guardado porque o PyMongo não é fork-safe: um processo filho (worker do
+# gunicorn com --preload) precisa criar o seu próprio cliente.
+_init_lock = threading.Lock()
+_client_pid = None
+_app = None
+
 def init_db(app):
     """Inicializa as conexões com MongoDB e GridFS."""
+    global mongo_client, db, fs, _client_pid, _app
+
+    _app = app
+    if mongo_client is not None and _client_pid == os.getpid():
+        return
+
+    with _init_lock:
+        if mongo_client is not None and _client_pid == os.getpid():
+            return
+        _connect(app)
+        _client_pid = os.getpid()
+
+def _connect(app):
+    """Cria o MongoClient e as referências ao banco e ao GridFS."""
     global mongo_client, db, fs
     
-    mongo_client = MongoClient(app.config['MONGO_URI'])
+    # Um único MongoClient por processo: o pool de conexões é compartilhado por
+    # todas as requisições, evitando um novo handshake TCP/TLS a cada chamada.
+    # A compressão de rede (zstd, com zlib como fallback) reduz o tamanho das
+    # respostas de listagem e dos chunks trafegados pelo GridFS.
+    # Os timeouts fazem uma requisição falhar rápido quando o cluster está
+    # inacessível ou o pool está esgotado, em vez de prender o worker.
+    mongo_client = MongoClient(
+        app.config['MONGO_URI'],
+        maxPoolSize=app.config['MONGO_MAX_POOL_SIZE'],
+        minPoolSize=app.config['MONGO_MIN_POOL_SIZE'],
+        maxIdleTimeMS=app.config['MONGO_MAX_IDLE_TIME_MS'],
+        serverSelectionTimeoutMS=app.config['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+        waitQueueTimeoutMS=app.config['MONGO_WAIT_QUEUE_TIMEOUT_MS'],
+        retryWrites=True,
+        compressors=app.config['MONGO_COMPRESSORS'],
+    )
     
     # MUDANÇA AQUI: Em vez de adivinhar, pegamos o nome do DB explicitamente
     db_name = app.config['MONGO_DB_NAME']
@@ -28,10 +68,31 @@ def init_db(app):
     except Exception as e:
         print(f"Erro ao conectar com o MongoDB: {e}")
 
+def close_db():
+    """Fecha o MongoClient (e suas threads de monitoramento) deste processo."""
+    global mongo_client, db, fs, _client_pid
+    with _init_lock:
+        if mongo_client is not None and _client_pid == os.getpid():
+            mongo_client.close()
+        mongo_client, db, fs, _client_pid = None, None, None, None
+
+atexit.register(close_db)
+
+def _ensure_client():
+    """Recria o cliente se este processo foi criado por fork depois do init_db."""
+    if _app is not None and _client_pid != os.getpid():
+        init_db(_app)
+
+# get_db()/get_gridfs() apenas devolvem as referências globais criadas em
+# init_db: chamá-las várias vezes numa mesma requisição custa só uma checagem
+# de PID, e elas também funcionam fora do contexto de requisição (ferramentas
+# e nós do grafo).
 def get_db():
     """Retorna a instância do banco de dados."""
+    _ensure_client()
     return db
 
 def get_gridfs():
     """Retorna a instância do GridFS."""
+    _ensure_client()
     return fs
\ No newline at end of file
@@ -1,5 +1,5 @@
 # src/models/tool_response.py
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, Dict, Any, List
 import logging
 
@@ -10,6 +10,8 @@ class ToolResponse(BaseModel):
     Modelo padrão para respostas de todas as tools.
     Garante consistência no formato de retorno.
     """
+    model_config = ConfigDict(extra="forbid", frozen=True)
+
     status: str  # "success" ou "error"
     message: Optional[str] = None
     data: Optional[Dict[str, Any]] = None
@@ -17,17 +19,21 @@ class ToolResponse(BaseModel):
 
     def to_dict(self) -> Dict[str, Any]:
         """Converte para dicionário, removendo campos None"""
-        return {k: v for k, v in self.dict().items() if v is not None}
+        # Só os campos de topo são removidos: valores None dentro de `data`
+        # (ex.: campos vazios de um contexto) continuam no dicionário, por isso
+        # não usamos `exclude_none`, que atuaria de forma recursiva.
+        return self.model_dump(exclude={k for k, v in self.__dict__.items() if v is None})
 
     @classmethod
     def success(cls, message: str = None, data: Dict[str, Any] = None) -> 'ToolResponse':
         """Cria uma resposta de sucesso"""
-        return cls(status="success", message=message, data=data)
+        # Os construtores são chamados só pelo nosso código: dispensamos a validação.
+        return cls.model_construct(status="success", message=message, data=data)
 
     @classmethod
     def error(cls, message: str, error_code: str = None, data: Dict[str, Any] = None) -> 'ToolResponse':
         """Cria uma resposta de erro"""
-        return cls(status="error", message=message, error_code=error_code, data=data)
+        return cls.model_construct(status="error", message=message, error_code=error_code, data=data)
 
 # Códigos de erro padronizados
 class ErrorCodes:
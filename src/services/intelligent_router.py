@@ -1,11 +1,16 @@
 # src/services/intelligent_router.py
 
-from typing import List, Literal, Union
+import hashlib
+import re
+import threading
+from typing import List, Literal
+import orjson
+from cachetools import TTLCache
 from pydantic import BaseModel, Field
 from langchain_core.prompts import ChatPromptTemplate
 # from langchain_google_genai import ChatGoogleGenerativeAI
 from src.tasks.llm_fallback import FallbackLLM
-from src.config import Config
+from src.services.small_talk import canned_reply
 
 # --- 1. Defina as "Ferramentas" que representam cada intenção ---
 # Cada classe descreve um fluxo de trabalho para o LLM.
@@ -29,11 +34,181 @@ class GeneralChat(BaseModel):
     user_request: str = Field(description="A solicitação ou pergunta original do usuário.")
 
 
-# --- 2. Crie o Roteador ---
+# --- 2. Prompt do Roteador ---
+# O texto é estático: montamos o template uma única vez, na importação, e a cada
+# chamada só as variáveis ({history}, {has_attachment}, {prompt}) são formatadas.
+
+_ROUTER_SYSTEM_PROMPT = """
+**PERSONA:** Você é um Roteador de Intenções de Nível Sênior. Sua única função é analisar meticulosamente a solicitação do usuário e invocar a ferramenta mais adequada. Você é extremamente lógico e segue as regras à risca.
+
+**CONTEXTO ATUAL:**
+- Histórico da Conversa Recente: {history}
+- Usuário anexou um documento para esta solicitação: {has_attachment}
+
+**MANUAL DE OPERAÇÕES DE ROTEAMENTO (REGRAS CRÍTICAS):**
+
+**1. Ferramenta `CreateDocument`:**
+- **DIRETIVA:** Invoque quando a intenção primária for **CRIAR um novo artefato de arquivo** (documento, planilha, etc.) a partir de uma ideia ou dados.
+- **Gatilhos Fortes:** "faça um relatório", "crie uma planilha", "gere um documento", "elabore uma lista em excel".
+- **Análise do `file_type`:**
+    - "planilha", "tabela", "excel", "colunas" -> `xlsx`.
+    - "documento formal", "pdf" -> `pdf`.
+    - "relatório", "texto", "carta", "documento", sem especificação -> `docx`.
+- **Exemplo de Alta Confiança 1:**
+    - Prompt: "preciso de uma planilha com nomes de projetos e datas de entrega"
+    - Invocação Correta: `CreateDocument(topic='nomes de projetos e datas de entrega', file_type='xlsx')`
+- **Exemplo de Alta Confiança 2:**
+    - Prompt: "escreva um resumo de uma página sobre a revolução industrial e me dê em pdf"
+    - Invocação Correta: `CreateDocument(topic='resumo sobre a revolução industrial', file_type='pdf')`
+- **Cenário de Ambiguidade (Resolver para `CreateDocument`):**
+    - Prompt: "pode colocar essas ideias num arquivo pra mim?" -> O usuário quer um arquivo. É `CreateDocument`.
+- **Cenário de Exclusão (NÃO invocar):**
+    - Prompt: "gosto de criar documentos" -> É uma afirmação, não um pedido. Usar `GeneralChat`.
+
+**2. Ferramenta `FillTemplate`:**
+- **DIRETIVA:** Invoque **SOMENTE SE** as duas condições a seguir forem atendidas: (1) O usuário menciona a palavra "template" (ou sinônimos como "modelo", "padrão"). (2) O usuário fornece um nome de arquivo que termina em `.docx`.
+- **Exemplo de Alta Confiança:**
+    - Prompt: "usar o modelo 'proposta_cliente_v2.docx' para a empresa Soluções Alfa"
+    - Invocação Correta: `FillTemplate(template_name='proposta_cliente_v2.docx', topic='proposta para a empresa Soluções Alfa')`
+- **Cenário de Exclusão (NÃO invocar):**
+    - Prompt: "qual o melhor template para propostas?" -> É uma pergunta sobre templates. Usar `GeneralChat`.
+    - Prompt: "use o modelo que te passei antes" -> Ambíguo, sem nome de arquivo explícito. Usar `GeneralChat` para pedir esclarecimento.
+
+**3. Ferramenta `ReadDocument`:**
+- **DIRETIVA:** Invoque **SOMENTE SE** `has_attachment=True` E o prompt do usuário for uma pergunta ou comando **sobre o conteúdo do anexo**.
+- **Exemplo de Alta Confiança:**
+    - Prompt: "faça um resumo dos pontos principais deste arquivo"
+    - Invocação Correta: `ReadDocument(question='resumo dos pontos principais do arquivo')`
+- **Exemplo de Alta Confiança 2:**
+    - Prompt: "quais foram os valores de vendas de maio segundo a planilha?"
+    - Invocação Correta: `ReadDocument(question='valores de vendas de maio segundo a planilha')`
+- **Cenário de Exclusão (NÃO invocar):**
+    - Prompt: "arquivo recebido, obrigado!" (`has_attachment=True`) -> É uma confirmação, não um comando. Usar `GeneralChat`.
+
+**4. Ferramenta `GeneralChat` (A Regra de Ouro do Fallback):**
+- **DIRETIVA:** Se a solicitação não se encaixar **PERFEITAMENTE** em nenhuma das 3 categorias acima, **VOCÊ DEVE USAR `GeneralChat`**. É melhor pedir esclarecimento do que executar a ação errada.
+- **Exemplos de Alta Confiança:**
+    - Prompt: "bom dia" -> `GeneralChat(user_request='bom dia')`
+    - Prompt: "o que vc pode fazer?" -> `GeneralChat(user_request='o que vc pode fazer?')`
+    - Prompt: "liste os templates" -> `GeneralChat(user_request='liste os templates')` (O nó de chat saberá como lidar com isso).
+    - Prompt: "interessante esse relatório" -> `GeneralChat(user_request='interessante esse relatório')`
+    - Prompt: "converta o documento anterior para pdf" -> Ambíguo. O sistema atual não tem um fluxo de "conversão". `GeneralChat` deve lidar com a resposta.
+
+**Processo de Raciocínio (Seu Monólogo Interno):**
+1.  O usuário pediu para **CRIAR** um arquivo do zero? -> `CreateDocument`.
+2.  O usuário mencionou "template" E um nome de arquivo `.docx`? -> `FillTemplate`.
+3.  Há um anexo E o usuário está perguntando sobre ele? -> `ReadDocument`.
+4.  Nenhuma das anteriores? -> `GeneralChat`. Sem exceções.
+
+**FORMATO DE SAÍDA:** Invoque a ferramenta escolhida com os argumentos corretamente preenchidos.
+"""
+
+# Caracteres de cada mensagem do histórico enviados ao roteador
+_HISTORY_CONTENT_CHARS = 200
+
+_ROUTER_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", _ROUTER_SYSTEM_PROMPT),
+    ("human", "{prompt}"),
+])
+
+
+# --- Atalho determinístico ---
+# A regra do `FillTemplate` é objetiva (menciona template/modelo/padrão E traz um
+# nome de arquivo .docx). Só usamos o atalho para PEDIDOS inequívocos: frase no
+# imperativo, sem pergunta e com um único .docx. O resto segue para o LLM.
+_TEMPLATE_WORDS = frozenset({"template", "templates", "modelo", "modelos", "padrão"})
+_WORD_RE = re.compile(r"\w+")
+_SPACES_RE = re.compile(r"\s+")
+_DOCX_NAME_RE = re.compile(r"([\w\-]+\.docx)\b", re.IGNORECASE)
+_IMPERATIVE_VERBS = frozenset({
+    "use", "usar", "usa", "utilize", "utilizar", "preencha", "preencher",
+    "gere", "gerar", "crie", "criar", "faça", "fazer", "monte", "montar",
+})
+_POLITE_WORDS = frozenset({"por", "favor", "pfv", "pf"})
+# Partes removidas do tópico: o nome do arquivo (com aspas), a palavra "template"
+# com o artigo/preposição que a acompanha e o verbo do pedido no início.
+_TOPIC_DOCX_RE = re.compile(r"[\"'`“”‘’]?[\w\-]+\.docx\b[\"'`“”‘’]?", re.IGNORECASE)
+_TOPIC_TEMPLATE_RE = re.compile(
+    r"\b(?:(?:o|os|do|dos|no|nos|com o|com os|como|esse|este|seguinte)\s+)?(?:templates?|modelos?|padrão)\b",
+    re.IGNORECASE,
+)
+_TOPIC_LEADING_RE = re.compile(r"^(?:por favor|pfv|pf)?[\s,]*\w+[\s,:]*", re.IGNORECASE)
+
+def _fast_topic(prompt: str) -> str:
+    """Extrai o assunto do pedido, sem o nome do template, a palavra-chave e o verbo."""
+    topic = _TOPIC_TEMPLATE_RE.sub(" ", _TOPIC_DOCX_RE.sub(" ", prompt))
+    topic = _TOPIC_LEADING_RE.sub("", _SPACES_RE.sub(" ", topic).strip(), count=1)
+    topic = topic.strip(" ,.;:-")
+    return topic or prompt
+
+def _fast_route(prompt: str):
+    """Retorna (nome_da_ferramenta, args) quando a intenção é inequívoca, senão None."""
+    # Saudações e agradecimentos são sempre `GeneralChat` (respondidos sem LLM no nó).
+    if canned_reply(prompt):
+        return "GeneralChat", {"user_request": prompt}
+    if "?" in prompt:
+        return None
+    names = {name.lower(): name for name in _DOCX_NAME_RE.findall(prompt)}
+    if len(names) != 1:
+        return None
+    words = _WORD_RE.findall(prompt.lower())
+    if not _TEMPLATE_WORDS & frozenset(words):
+        return None
+    # O pedido precisa começar pelo verbo ("use o modelo x.docx ..."), opcionalmente
+    # precedido de "por favor"; perguntas e afirmações ficam com o LLM.
+    first_verb = next((w for w in words if w not in _POLITE_WORDS), None)
+    if first_verb not in _IMPERATIVE_VERBS:
+        return None
+    return "FillTemplate", {"template_name": next(iter(names.values())), "topic": _fast_topic(prompt)}
+
+
+# --- Cache de decisões ---
+# Mensagens curtas se repetem muito ("bom dia", "liste os templates", "ok").
+# Guardamos a decisão do LLM por alguns minutos, chaveada pelo prompt, pelo
+# anexo e pelas últimas 3 mensagens do histórico (o mesmo contexto que o LLM vê).
+_ROUTE_CACHE = TTLCache(maxsize=2048, ttl=300)
+_ROUTE_CACHE_LOCK = threading.Lock()
+
+def _route_cache_key(prompt: str, conversation_history: List[dict], has_attachment: bool) -> bytes:
+    """
+    Chave compacta (digest de 16 bytes) da decisão de roteamento; prompts longos
+    não ficam retidos no cache. O prompt entra exatamente como veio: os argumentos
+    guardados (`user_request`, `question`, `topic`) são copiados do texto de quem
+    preencheu o cache, então só podem ser reaproveitados pelo mesmo texto.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(prompt.encode("utf-8", "surrogatepass"))
+    h.update(b"\x01" if has_attachment else b"\x00")
+    for m in conversation_history[-3:]:
+        h.update(b"\x1e")
+        h.update(f"{m.get('role')}\x1f{m.get('content')}".encode("utf-8", "surrogatepass"))
+    return h.digest()
+
+
+# --- 3. Crie o Roteador ---
 # Esta classe vai amarrar tudo.
 
 class IntelligentRouter:
-    def __init__(self):
+    """
+    Roteador de intenções. É um singleton por processo: o FallbackLLM e o
+    `bind_tools` (que converte os schemas Pydantic das ferramentas) são
+    montados uma única vez, na primeira instanciação, e compartilhados por
+    todas as requisições/threads.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        # Double-checked locking: evita o lock depois que a instância existe.
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    instance = super().__new__(cls)
+                    instance._setup()
+                    cls._instance = instance
+        return cls._instance
+
+    def _setup(self):
         self.llm = FallbackLLM(temperature=0.1)
         # Em vez de with_structured_output, usamos .bind_tools() para permitir
         # que o LLM escolha entre MÚLTIPLAS ferramentas/esquemas.
@@ -50,76 +225,32 @@ class IntelligentRouter:
         Analisa o prompt do usuário e o contexto para determinar a intenção correta.
         Retorna o nome da ferramenta escolhida e seus argumentos.
         """
-        system_prompt = f"""
-        **PERSONA:** Você é um Roteador de Intenções de Nível Sênior. Sua única função é analisar meticulosamente a solicitação do usuário e invocar a ferramenta mais adequada. Você é extremamente lógico e segue as regras à risca.
-
-        **CONTEXTO ATUAL:**
-        - Histórico da Conversa Recente: {conversation_history[-3:]} # Apenas as últimas 3 mensagens são mais relevantes
-        - Usuário anexou um documento para esta solicitação: {has_attachment}
-
-        **MANUAL DE OPERAÇÕES DE ROTEAMENTO (REGRAS CRÍTICAS):**
-
-        **1. Ferramenta `CreateDocument`:**
-        - **DIRETIVA:** Invoque quando a intenção primária for **CRIAR um novo artefato de arquivo** (documento, planilha, etc.) a partir de uma ideia ou dados.
-        - **Gatilhos Fortes:** "faça um relatório", "crie uma planilha", "gere um documento", "elabore uma lista em excel".
-        - **Análise do `file_type`:**
-            - "planilha", "tabela", "excel", "colunas" -> `xlsx`.
-            - "documento formal", "pdf" -> `pdf`.
-            - "relatório", "texto", "carta", "documento", sem especificação -> `docx`.
-        - **Exemplo de Alta Confiança 1:**
-            - Prompt: "preciso de uma planilha com nomes de projetos e datas de entrega"
-            - Invocação Correta: `CreateDocument(topic='nomes de projetos e datas de entrega', file_type='xlsx')`
-        - **Exemplo de Alta Confiança 2:**
-            - Prompt: "escreva um resumo de uma página sobre a revolução industrial e me dê em pdf"
-            - Invocação Correta: `CreateDocument(topic='resumo sobre a revolução industrial', file_type='pdf')`
-        - **Cenário de Ambiguidade (Resolver para `CreateDocument`):**
-            - Prompt: "pode colocar essas ideias num arquivo pra mim?" -> O usuário quer um arquivo. É `CreateDocument`.
-        - **Cenário de Exclusão (NÃO invocar):**
-            - Prompt: "gosto de criar documentos" -> É uma afirmação, não um pedido. Usar `GeneralChat`.
-
-        **2. Ferramenta `FillTemplate`:**
-        - **DIRETIVA:** Invoque **SOMENTE SE** as duas condições a seguir forem atendidas: (1) O usuário menciona a palavra "template" (ou sinônimos como "modelo", "padrão"). (2) O usuário fornece um nome de arquivo que termina em `.docx`.
-        - **Exemplo de Alta Confiança:**
-            - Prompt: "usar o modelo 'proposta_cliente_v2.docx' para a empresa Soluções Alfa"
-            - Invocação Correta: `FillTemplate(template_name='proposta_cliente_v2.docx', topic='proposta para a empresa Soluções Alfa')`
-        - **Cenário de Exclusão (NÃO invocar):**
-            - Prompt: "qual o melhor template para propostas?" -> É uma pergunta sobre templates. Usar `GeneralChat`.
-            - Prompt: "use o modelo que te passei antes" -> Ambíguo, sem nome de arquivo explícito. Usar `GeneralChat` para pedir esclarecimento.
-
-        **3. Ferramenta `ReadDocument`:**
-        - **DIRETIVA:** Invoque **SOMENTE SE** `has_attachment=True` E o prompt do usuário for uma pergunta ou comando **sobre o conteúdo do anexo**.
-        - **Exemplo de Alta Confiança:**
-            - Prompt: "faça um resumo dos pontos principais deste arquivo"
-            - Invocação Correta: `ReadDocument(question='resumo dos pontos principais do arquivo')`
-        - **Exemplo de Alta Confiança 2:**
-            - Prompt: "quais foram os valores de vendas de maio segundo a planilha?"
-            - Invocação Correta: `ReadDocument(question='valores de vendas de maio segundo a planilha')`
-        - **Cenário de Exclusão (NÃO invocar):**
-            - Prompt: "arquivo recebido, obrigado!" (`has_attachment=True`) -> É uma confirmação, não um comando. Usar `GeneralChat`.
-
-        **4. Ferramenta `GeneralChat` (A Regra de Ouro do Fallback):**
-        - **DIRETIVA:** Se a solicitação não se encaixar **PERFEITAMENTE** em nenhuma das 3 categorias acima, **VOCÊ DEVE USAR `GeneralChat`**. É melhor pedir esclarecimento do que executar a ação errada.
-        - **Exemplos de Alta Confiança:**
-            - Prompt: "bom dia" -> `GeneralChat(user_request='bom dia')`
-            - Prompt: "o que vc pode fazer?" -> `GeneralChat(user_request='o que vc pode fazer?')`
-            - Prompt: "liste os templates" -> `GeneralChat(user_request='liste os templates')` (O nó de chat saberá como lidar com isso).
-            - Prompt: "interessante esse relatório" -> `GeneralChat(user_request='interessante esse relatório')`
-            - Prompt: "converta o documento anterior para pdf" -> Ambíguo. O sistema atual não tem um fluxo de "conversão". `GeneralChat` deve lidar com a resposta.
-
-        **Processo de Raciocínio (Seu Monólogo Interno):**
-        1.  O usuário pediu para **CRIAR** um arquivo do zero? -> `CreateDocument`.
-        2.  O usuário mencionou "template" E um nome de arquivo `.docx`? -> `FillTemplate`.
-        3.  Há um anexo E o usuário está perguntando sobre ele? -> `ReadDocument`.
-        4.  Nenhuma das anteriores? -> `GeneralChat`. Sem exceções.
-
-        **FORMATO DE SAÍDA:** Invoque a ferramenta escolhida com os argumentos corretamente preenchidos.
-        """
-        
+        fast = _fast_route(prompt)
+        if fast:
+            return fast
+
+        cache_key = _route_cache_key(prompt, conversation_history, has_attachment)
+        with _ROUTE_CACHE_LOCK:
+            cached = _ROUTE_CACHE.get(cache_key)
+        if cached:
+            tool_name, tool_args = cached
+            return tool_name, dict(tool_args)
+
+        # Apenas as últimas 3 mensagens são relevantes para o roteamento. Elas vão
+        # como JSON compacto (mais curto que o repr de dicts do Python), só com o
+        # papel e o início do conteúdo, para limitar o tamanho do prompt.
+        recent_history = [
+            {"role": m.get("role"), "content": (m.get("content") or "")[:_HISTORY_CONTENT_CHARS]}
+            for m in conversation_history[-3:]
+        ]
+        messages = _ROUTER_PROMPT.format_messages(
+            history=orjson.dumps(recent_history).decode(),
+            has_attachment=has_attachment,
+            prompt=prompt,
+        )
+
         # Invocamos o LLM com as ferramentas vinculadas
-        ai_msg = self.runnable.invoke([
-            ("system", system_prompt),
-            ("human", prompt)
-        ])
+        ai_msg = self.runnable.invoke(messages)
         
         # A resposta conterá uma lista de `tool_calls`. Pegamos a primeira.
         # Se não houver chamadas de ferramenta, algo deu errado, então usamos um fallback.
@@ -128,4 +259,6 @@ class IntelligentRouter:
             return "GeneralChat", {"user_request": prompt}
 
         first_tool_call = ai_msg.tool_calls[0]
+        with _ROUTE_CACHE_LOCK:
+            _ROUTE_CACHE[cache_key] = (first_tool_call['name'], dict(first_tool_call['args']))
         return first_tool_call['name'], first_tool_call['args']
\ No newline at end of file
@@ -0,0 +1,53 @@
+# src/services/small_talk.py
+
+"""
+Respostas prontas para mensagens triviais ("oi", "bom dia", "obrigado", "tchau").
+
+Essas mensagens são frequentes e não dependem de contexto: não faz sentido pagar
+uma chamada ao roteador e outra ao LLM do chat para respondê-las. Só a mensagem
+INTEIRA é comparada (após normalização), então "oi, crie um relatório" continua
+indo para o fluxo normal.
+
+Afirmações curtas ("sim", "isso", "ok") ficam de fora de propósito: normalmente
+respondem a uma pergunta de esclarecimento do assistente e precisam do LLM.
+"""
+
+import re
+import unicodedata
+from typing import Optional
+
+_NON_WORD_RE = re.compile(r"[^\w\s]+")
+_SPACES_RE = re.compile(r"\s+")
+
+_GREETING_REPLY = "Olá! Sou o TPF-AI. Posso conversar, criar documentos (DOCX, XLSX e PDF), preencher templates e ler arquivos anexados. Como posso ajudar?"
+_THANKS_REPLY = "Por nada! Se precisar de mais alguma coisa, é só chamar."
+_FAREWELL_REPLY = "Até mais! Quando quiser continuar, estarei por aqui."
+
+# Chaves já normalizadas: minúsculas, sem acentos e sem pontuação.
+_CANNED_REPLIES = {
+    **dict.fromkeys(
+        ("oi", "ola", "oie", "opa", "eai", "e ai", "hello", "hi",
+         "bom dia", "boa tarde", "boa noite", "oi bom dia", "oi boa tarde", "oi boa noite",
+         "ola bom dia", "ola boa tarde", "ola boa noite"),
+        _GREETING_REPLY,
+    ),
+    **dict.fromkeys(
+        ("obrigado", "obrigada", "obg", "valeu", "vlw", "muito obrigado", "muito obrigada",
+         "obrigado mesmo", "brigado", "brigada", "thanks", "thank you"),
+        _THANKS_REPLY,
+    ),
+    **dict.fromkeys(
+        ("tchau", "ate mais", "ate logo", "ate amanha", "falou", "bye"),
+        _FAREWELL_REPLY,
+    ),
+}
+
+def _normalize(text: str) -> str:
+    sem_acentos = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return _SPACES_RE.sub(" ", _NON_WORD_RE.sub(" ", sem_acentos.lower())).strip()
+
+def canned_reply(prompt: Optional[str]) -> Optional[str]:
+    """Retorna a resposta pronta para a mensagem, ou None se ela não for trivial."""
+    if not prompt or len(prompt) > 40:
+        return None
+    return _CANNED_REPLIES.get(_normalize(prompt))
@@ -1,51 +1,103 @@
 # /src/tasks/file_generators.py
-import io
 import logging
-from typing import Iterable, List, Optional, Any
+import re
+import tempfile
+from functools import lru_cache
+from typing import IO, Iterable, Iterator, Optional, Any
+from xml.sax.saxutils import escape
 
-from docx import Document
-from openpyxl import Workbook
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+# python-docx, openpyxl e reportlab são importados dentro de cada `criar_*`:
+# somam centenas de ms e dezenas de MB ao carregar o worker, e a maioria das
+# requisições (chat) nunca gera arquivo. Após o primeiro uso, o import é só
+# uma consulta a sys.modules.
 
 logger = logging.getLogger(__name__)
 
+# Arquivos gerados ficam em memória até este tamanho; acima disso, o conteúdo
+# passa automaticamente para um arquivo temporário em disco.
+_SPOOL_MAX_SIZE = 4 * 1024 * 1024
+
+# Separador de colunas das linhas do XLSX: ';' com quaisquer espaços em volta.
+_SEPARADOR_COLUNAS = re.compile(r"\s*;\s*")
+
+
+class _SpooledStream(tempfile.SpooledTemporaryFile):
+    """
+    SpooledTemporaryFile que aceita `stream.name = ...`. Na classe base, `name`
+    é uma property somente leitura; o atributo de classe abaixo a sobrepõe.
+    """
+    name = None
+
+
+def _novo_stream() -> _SpooledStream:
+    return _SpooledStream(max_size=_SPOOL_MAX_SIZE, mode='w+b')
+
+@lru_cache(maxsize=1)
+def _pdf_styles():
+    """
+    Estilos e espaçador do PDF, criados uma única vez (no primeiro PDF gerado):
+    getSampleStyleSheet() monta ~20 ParagraphStyle a cada chamada, e um Spacer não
+    guarda estado entre usos, então a mesma instância pode ser reutilizada.
+    Retorna (estilo do título, espaçador do título, estilo dos tópicos).
+    """
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.platypus import Spacer
+
+    styles = getSampleStyleSheet()
+    # O espaço entre tópicos fica no próprio estilo (spaceAfter), em vez de um
+    # Spacer por tópico: metade dos flowables para o layout do platypus percorrer.
+    topic_style = ParagraphStyle('Topico', parent=styles['Normal'], spaceAfter=6)
+    return styles['h1'], Spacer(1, 12), topic_style
+
 
 # NOTA: Alterei o tipo para Iterable[Any] para ser um pouco mais explícito,
 # já que a função lida com a conversão de qualquer tipo para string.
-def _normalize_topicos(topicos: Optional[Iterable[Any]]) -> List[str]:
-    """Normaliza entrada: aceita None, iteráveis; converte cada item para str e filtra None."""
+def _iter_topicos(topicos: Optional[Iterable[Any]]) -> Iterator[str]:
+    """
+    Normaliza entrada: aceita None, iteráveis; converte cada item para str (None vira "").
+    Retorna um gerador consumido direto pelo laço de escrita de cada formato, sem
+    materializar uma lista intermediária com todos os tópicos.
+    """
     if topicos is None:
-        return []
+        return iter(())
     try:
-        # A lógica aqui já é excelente, convertendo qualquer coisa para string.
-        return ["" if t is None else str(t) for t in topicos]
+        # `iter()` é chamado já aqui para que um argumento inválido falhe antes
+        # de começarmos a gerar o arquivo, e não no meio do laço.
+        iterador = iter(topicos)
     except TypeError:
         # A mensagem de erro é clara e útil. Ótimo!
         raise ValueError("topicos deve ser um iterável ou None")
+    return ("" if t is None else str(t) for t in iterador)
 
 
 def criar_docx_stream(
     topicos: Optional[Iterable[Any]] = None,
     filename: str = "relatorio.docx",
     title: str = "Relatório Gerado por IA"  # SUGESTÃO: Adicionado parâmetro de título.
-) -> io.BytesIO:
+) -> IO[bytes]:
     """
-    Cria DOCX em memória e retorna BytesIO.
+    Cria DOCX e retorna um stream binário (em memória ou, se grande, em disco).
     topicos: iterável de strings.
     filename: opcional (atribui stream.name).
     title: título principal do documento.
     """
-    topicos = _normalize_topicos(topicos)
-    stream = io.BytesIO()
+    from docx import Document
+
+    topicos = _iter_topicos(topicos)
+    stream = _novo_stream()
     try:
         doc = Document()
         doc.add_heading(title, 0)  # Usa o título customizável.
+        # Criamos os parágrafos direto no XML do corpo (<w:p><w:r><w:t>), sem o
+        # wrapper `Paragraph` do python-docx a cada tópico. `add_p()` já insere
+        # antes do <w:sectPr>, e o setter `text` do run trata espaços, tabs e quebras.
+        body = doc.element.body
         for topico in topicos:
             # NOTA: Para conteúdo mais rico, aqui seria o lugar para adicionar lógica
             # para, por exemplo, criar parágrafos, listas com marcadores, etc.
-            doc.add_paragraph(topico)
+            p = body.add_p()
+            if topico:
+                p.add_r().text = topico
         doc.save(stream)
         stream.seek(0)
         stream.name = filename
@@ -58,27 +110,29 @@ def criar_docx_stream(
 def criar_xlsx_stream(
     topicos: Optional[Iterable[Any]] = None,
     filename: str = "relatorio.xlsx",
-    title: str = "Relatório IA",
-    write_only: bool = False  # Mantendo o parâmetro para consistência
-) -> io.BytesIO:
+    title: str = "Relatório IA"
+) -> IO[bytes]:
     """
-    Cria XLSX em memória e retorna BytesIO.
+    Cria XLSX e retorna um stream binário (em memória ou, se grande, em disco).
     Interpreta cada 'topico' como uma linha e separa as colunas pelo caractere ';'.
+    Usa o modo write_only do openpyxl: as linhas são gravadas direto no stream,
+    sem manter um objeto `Cell` por célula em memória.
     """
-    topicos = _normalize_topicos(topicos)
-    stream = io.BytesIO()
+    from openpyxl import Workbook
+
+    topicos = _iter_topicos(topicos)
+    stream = _novo_stream()
     try:
-        wb = Workbook(write_only=write_only)
-        ws = wb.create_sheet(title=title) if write_only else wb.active
-        if not write_only:
-            ws.title = title
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(title=title)
 
         for linha_texto in topicos:
             # --- INÍCIO DA MUDANÇA ---
             # Adiciona a linha apenas se ela tiver conteúdo real
             if linha_texto and linha_texto.strip():
-                # Divide a linha de texto pelo separador para criar as colunas
-                colunas = [celula.strip() for celula in linha_texto.split(';')]
+                # Divide a linha de texto pelo separador para criar as colunas; a regex
+                # já remove os espaços em volta de cada ';' no mesmo passe em C.
+                colunas = _SEPARADOR_COLUNAS.split(linha_texto.strip())
                 # O método .append() do openpyxl aceita uma lista e a distribui pelas colunas
                 ws.append(colunas)
             # --- FIM DA MUDANÇA ---
@@ -96,21 +150,24 @@ def criar_pdf_stream(
     topicos: Optional[Iterable[Any]] = None,
     filename: str = "relatorio.pdf",
     title: str = "Relatório Gerado por IA"
-) -> io.BytesIO:
+) -> IO[bytes]:
     """
-    Cria PDF em memória e retorna BytesIO.
+    Cria PDF e retorna um stream binário (em memória ou, se grande, em disco).
     Para templates PDF, sugiro usar outra função que preencha formulários (pdfrw/pypdf).
     """
-    topicos = _normalize_topicos(topicos)
-    stream = io.BytesIO()
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph
+
+    topicos = _iter_topicos(topicos)
+    stream = _novo_stream()
     try:
+        title_style, title_spacer, topic_style = _pdf_styles()
         doc = SimpleDocTemplate(stream, pagesize=letter)
-        styles = getSampleStyleSheet()
         # A construção dos "flowables" está perfeita para reportlab.
-        flowables = [Paragraph(title, styles['h1']), Spacer(1, 12)]
-        for topico in topicos:
-            flowables.append(Paragraph(topico, styles['Normal']))
-            flowables.append(Spacer(1, 6))
+        flowables = [Paragraph(title, title_style), title_spacer]
+        # Os tópicos são texto puro: escapamos '&', '<' e '>' para que o parser de
+        # marcação do Paragraph não os interprete (e não falhe com eles).
+        flowables.extend(Paragraph(escape(topico), topic_style) for topico in topicos)
         doc.build(flowables)
         stream.seek(0)
         stream.name = filename
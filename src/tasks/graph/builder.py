@@ -16,6 +16,9 @@ A instância `app_graph` é compilada uma única vez quando a aplicação inicia
 tornando a execução de cada requisição muito eficiente.
 """
 
+import os
+from operator import itemgetter
+
 from langgraph.graph import StateGraph, END
 from .state import GraphState
 from .nodes import (
@@ -28,6 +31,32 @@ from .nodes import (
     final_response_node   
 )
 
+# --- Funções de Roteamento ---
+# Definidas no nível do módulo (e não como lambdas/closures dentro de build_graph)
+# para que sejam criadas uma única vez e tenham nome legível em logs e tracebacks.
+_get_routed_tool_call = itemgetter("routed_tool_call")
+
+def route_after_router(state: GraphState) -> str:
+    """Lê o nome da ferramenta escolhida pelo roteador."""
+    return _get_routed_tool_call(state)["tool"]
+
+# Mapeamento: "NomeDaFerramenta" -> "nome_do_proximo_no".
+# Mantido como dict comum: o LangGraph só aceita dict/list como path_map.
+ROUTER_PATH_MAP = {
+    "FillTemplate": "fill_template_flow",
+    "CreateDocument": "create_document_flow",
+    "ReadDocument": "read_document_flow",
+    "GeneralChat": "general_chat_flow",
+}
+
+def after_validation(state: GraphState):
+    if state.get("tool_output"):
+        # Se a ferramenta foi chamada, o fluxo está completo
+        return "final_responder"
+    # Se recebemos uma pergunta de esclarecimento, o fluxo termina por agora
+    # e a pergunta será a resposta final.
+    return END
+
 def build_graph():
     """
     Constrói e compila o grafo de execução da IA usando StateGraph.
@@ -58,14 +87,8 @@ def build_graph():
     # Isso substitui a necessidade de um agente "Gerente" e a lógica `if/elif`.
     workflow.add_conditional_edges(
         "router",  # Nó de origem
-        lambda state: state["routed_tool_call"]["tool"],  # Função que lê o nome da ferramenta
-        {
-            # Mapeamento: "NomeDaFerramenta" -> "nome_do_proximo_no"
-            "FillTemplate": "fill_template_flow",
-            "CreateDocument": "create_document_flow",
-            "ReadDocument": "read_document_flow",
-            "GeneralChat": "general_chat_flow",
-        }
+        route_after_router,  # Função que lê o nome da ferramenta
+        ROUTER_PATH_MAP,
     )
 
     # --- ETAPA 4: Adicionar Arestas Normais (O Fluxo Sequencial) ---
@@ -78,15 +101,6 @@ def build_graph():
     workflow.add_edge('general_chat_flow', 'final_responder')
     
     # Adicione uma aresta condicional do validador
-    def after_validation(state: GraphState):
-        if "tool_output" in state and state["tool_output"]:
-            # Se a ferramenta foi chamada, o fluxo está completo
-            return "final_responder"
-        else:
-            # Se recebemos uma pergunta de esclarecimento, o fluxo termina por agora
-            # e a pergunta será a resposta final.
-            return END
-    
     workflow.add_conditional_edges("validator_clarifier", after_validation)
     
     # O nó 'final_responder' é o último passo antes de terminar a execução.
@@ -95,15 +109,18 @@ def build_graph():
     # Transforma nossa definição de nós e arestas em um objeto executável.
     app = workflow.compile()
     
-    # Adicionar um método para gerar uma imagem visual do grafo (ótimo para documentação e depuração)
-    # try:
-    #     # Tenta gerar a imagem se as dependências estiverem instaladas
-    #     # (pip install pygraphviz)
-    #     app.get_graph().draw_png("ia_workflow_graph.png")
-    #     print("Diagrama do grafo de IA salvo em 'ia_workflow_graph.png'")
-    # except ImportError:
-    #     print("PyGraphviz não instalado. Pule a geração da imagem do grafo.")
-    #     print("Para visualizar o grafo, instale: pip install pygraphviz")
+    # Gera uma imagem visual do grafo (ótimo para documentação e depuração).
+    # Só roda com DRAW_GRAPH=1: em produção, cada worker pularia um subprocesso
+    # do Graphviz e uma escrita em disco durante a importação.
+    if os.environ.get("DRAW_GRAPH") == "1":
+        try:
+            # Tenta gerar a imagem se as dependências estiverem instaladas
+            # (pip install pygraphviz)
+            app.get_graph().draw_png("ia_workflow_graph.png")
+            print("Diagrama do grafo de IA salvo em 'ia_workflow_graph.png'")
+        except ImportError:
+            print("PyGraphviz não instalado. Pule a geração da imagem do grafo.")
+            print("Para visualizar o grafo, instale: pip install pygraphviz")
     
     return app
 
@@ -14,21 +14,20 @@ Cada função aqui é um "nó" e segue um contrato simples:
 Esta abordagem modular torna o sistema fácil de entender, manter e estender.
 """
 
-import json
 import re
-from typing import Dict, Any
+import string
+import unicodedata
+from pathlib import Path
+from typing import Dict, Any, List
 from pydantic import BaseModel, Field
 
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.exceptions import OutputParserException
-from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.output_parsers import PydanticOutputParser, StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnableParallel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
-from src.config import Config
 from .state import GraphState
-from src.services.intelligent_router import IntelligentRouter, CreateDocument, FillTemplate, ReadDocument, GeneralChat
+from src.services.intelligent_router import IntelligentRouter
+from src.services.small_talk import canned_reply
 from src.tasks.tools import (
     template_lister_tool,
     template_inspector_tool,
@@ -36,6 +35,7 @@ from src.tasks.tools import (
     file_reader_tool,
 )
 from src.tasks.llm_fallback import FallbackLLM
+from src.config import Config
 from src.utils.observability import log_with_context
 
 from src.utils.markdown_converter import convert_markdown_to_docx_stream, convert_markdown_to_pdf_stream
@@ -62,13 +62,95 @@ logger = log_with_context(component="GraphNodes")
 try:
     # Cria uma instância do nosso LLM com fallback.
     llm = FallbackLLM(temperature=0.7)
+    # Mesma configuração, mas em modo JSON nativo do Gemini: usado onde a saída
+    # é parseada como JSON estruturado (preenchimento de templates).
+    json_llm = FallbackLLM(temperature=0.7, response_mime_type="application/json")
     logger.info("LLM com Fallback inicializado com sucesso.")
 except Exception as e:
     logger.error("Falha ao inicializar o LLM com Fallback.", error=str(e))
     llm = None
+    json_llm = None
 
 # --- Helper Functions (Extraídas do antigo ia_processor) ---
 
+# Palavras-chave que, no chat geral, indicam um pedido para listar templates.
+_TEMPLATE_KEYWORDS = frozenset({"template", "templates", "modelo", "modelos"})
+_WORD_RE = re.compile(r"\w+")
+# Nome de arquivo .doc/.docx citado no prompt (`\w` já inclui dígitos e '_').
+_TEMPLATE_NAME_RE = re.compile(r"['\"]?([\w\-]+\.docx?)['\"]?", re.IGNORECASE)
+
+# --- Prefixos Estáticos dos Prompts ---
+# Instruções fixas ficam SEMPRE no início do prompt e o conteúdo dinâmico (histórico,
+# pedido do usuário, documento) no final: prefixos idênticos entre requisições são
+# aproveitados pelo cache de contexto implícito do Gemini (menos latência e custo).
+
+# O prompt de preenchimento de templates (~90 linhas, com exemplos JSON) fica em
+# um arquivo próprio, lido uma única vez na importação. `string.Template` usa
+# campos `$nome`, então as chaves `{}` dos exemplos JSON não precisam de escape.
+_FILL_TEMPLATE_PROMPT = string.Template(
+    (Path(__file__).parent / "prompts" / "fill_template.tmpl").read_text(encoding="utf-8")
+)
+
+_PREFIX_CREATE_DOC = """\
+**PERSONA:** Você é um Redator Especialista que estrutura todo o seu conteúdo usando Markdown para garantir uma formatação rica.
+
+**TAREFA:** Escreva um conteúdo textual completo e detalhado sobre o tópico informado ao final.
+
+**REGRAS DE FORMATAÇÃO DO CONTEÚDO:**
+- Se o formato de destino final for `docx` ou `pdf`, VOCÊ DEVE USAR SINTAXE MARKDOWN (títulos com '#', negrito com '**', listas com '-',  `---` para criar linhas de separação, `| Cabeçalho |` ... para criar tabelas simples, ``` para blocos de código e `código inline` etc.).
+- Se o formato de destino final for `xlsx`, sua saída deve ser texto tabular (cabeçalho na primeira linha, colunas separadas por ';', e `\\n` para novas linhas).
+
+**IMPORTANTE:** Sua resposta deve conter APENAS o conteúdo bruto, sem nenhum comentário ou texto introdutório."""
+
+# Protocolo comum a todas as leituras de documento.
+_SUMMARIZE_PROTOCOL = """\
+**TAREFA:** Com base **EXCLUSIVAMENTE** na "Fonte de Verdade" informada no contexto ao final, responda à pergunta do usuário.
+
+**PROTOCOLO DE RESPOSTA (REGRAS CRÍTICAS):**
+1.  NÃO utilize conhecimento externo ou informações da internet.
+2.  Se a resposta não puder ser encontrada ou inferida a partir dos dados do documento, sua única resposta permitida é: "Com base na análise do documento, não encontrei uma resposta para a sua pergunta."
+3.  Seja direto e preciso em sua resposta. Forneça o resultado final sem explicações excessivas sobre como você chegou a ele, a menos que a pergunta peça isso."""
+
+_TABULAR_PREFIX = """\
+**PERSONA:** Você é um Analista de Dados especialista em interpretar dados tabulares apresentados em formato de texto.
+
+**INSTRUÇÕES ADICIONAIS:** A "Fonte de Verdade" é uma tabela. Analise sua estrutura de colunas e linhas para responder à pergunta. Você tem permissão para fazer inferências, raciocinar e executar cálculos simples (somas, contagens, encontrar valores máximos/mínimos) com base nos dados da tabela para chegar à resposta correta.
+
+""" + _SUMMARIZE_PROTOCOL
+
+# Persona + protocolo por tipo de conteúdo; 'text' cobre docx, pdf, txt e afins.
+_PREFIX_SUMMARIZE = {
+    "excel": _TABULAR_PREFIX,
+    "csv": _TABULAR_PREFIX,
+    "json": """\
+**PERSONA:** Você é um Engenheiro de Software especialista em estruturas de dados.
+
+**INSTRUÇÕES ADICIONAIS:** A "Fonte de Verdade" é um documento JSON. Navegue pela estrutura de chaves, valores, objetos e listas para encontrar a informação solicitada.
+
+""" + _SUMMARIZE_PROTOCOL,
+    "text": """\
+**PERSONA:** Você é um Assistente de Pesquisa especialista em análise textual.
+
+**INSTRUÇÕES ADICIONAIS:** Leia e interprete o texto do documento para encontrar a resposta para a pergunta do usuário.
+
+""" + _SUMMARIZE_PROTOCOL,
+}
+
+_PREFIX_CHAT = """\
+**PERSONA:** Você é o TPF-AI, um assistente de IA amigável, prestativo e profissional.
+
+**CAPACIDADES:** Você pode conversar sobre diversos tópicos, ajudar com tarefas criativas (escrever poemas, resumos), responder a perguntas gerais e, o mais importante, você pode criar e manipular documentos.
+
+**TAREFA:** Responda à última mensagem do usuário de forma útil e engajadora, mantendo o contexto das mensagens anteriores da conversa.
+
+**DIRETRIZES DE COMUNICAÇÃO:**
+- Seja sempre educado e claro.
+- Se você não souber uma resposta, diga que não sabe em vez de inventar.
+- Se a pergunta do usuário for ambígua, faça uma pergunta de esclarecimento para entender melhor a necessidade dele.
+- Mantenha as respostas relativamente concisas.
+
+**FORMATO DE SAÍDA:** Uma resposta em texto amigável."""
+
 class TemplateOutput(BaseModel):
     suggested_filename: str = Field(description="Um nome de arquivo lógico e descritivo em formato snake_case, terminando em .docx. Ex: relatorio_inspecao_global_corp.docx")
     context: dict = Field(description="O dicionário JSON com as chaves e valores para preencher o template.")
@@ -77,9 +159,72 @@ class DocumentOutput(BaseModel):
     suggested_filename: str = Field(description="Um nome de arquivo lógico e descritivo em formato snake_case, com a extensão correta (.docx, .xlsx, ou .pdf).")
     content: str = Field(description="O conteúdo textual completo para o corpo do documento.")
 
+# --- Prompts e Parsers Compilados ---
+# Criados uma única vez na importação: o parser introspecta o schema Pydantic e o
+# ChatPromptTemplate analisa as variáveis do texto; nos nós só chamamos `.invoke`.
+_TEMPLATE_PARSER = PydanticOutputParser(pydantic_object=TemplateOutput)
+_STR_PARSER = StrOutputParser()
+
+_CHAT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", _PREFIX_CHAT),
+    MessagesPlaceholder("history"),
+    ("human", "{prompt}"),
+])
+
+_CONTENT_PROMPT = ChatPromptTemplate.from_template(
+    _PREFIX_CREATE_DOC + '\n\n**TÓPICO:** "{topic}"\n'
+)
+
+# Tudo que não for letra minúscula ASCII ou dígito vira '_' no nome do arquivo.
+_SLUG_SEPARATOR_RE = re.compile(r"[^a-z0-9]+")
+_SLUG_MAX_LENGTH = 40
+
+def _slugify_filename(topic: str | None, file_type: str) -> str:
+    """
+    Gera um nome de arquivo em snake_case a partir do tópico, com a extensão pedida.
+    Ex.: "Relatório de Inspeção" -> "relatorio_de_inspecao.pdf".
+    """
+    # Remove acentos (NFKD separa a letra do diacrítico, que é descartado no encode).
+    ascii_topic = unicodedata.normalize("NFKD", topic or "").encode("ascii", "ignore").decode("ascii")
+    slug = _SLUG_SEPARATOR_RE.sub("_", ascii_topic.lower()).strip("_")[:_SLUG_MAX_LENGTH].rstrip("_")
+    return f"{slug or 'documento'}.{file_type}"
+
+def _history_to_messages(history: List[Dict[str, Any]], current_prompt: str) -> List[BaseMessage]:
+    """
+    Converte o histórico (documentos da coleção `messages`) em mensagens do LangChain.
+    A mensagem atual já está salva no banco e vem no fim do histórico; ela é removida
+    aqui porque o prompt a envia separadamente, como a última mensagem humana.
+    """
+    if history and history[-1].get("role") == "user" and history[-1].get("content") == current_prompt:
+        history = history[:-1]
+    return [
+        AIMessage(content=msg.get("content") or "") if msg.get("role") == "assistant"
+        else HumanMessage(content=msg.get("content") or "")
+        for msg in history
+    ]
+
+def _format_history_text(history: List[Dict[str, Any]]) -> str:
+    """
+    Histórico em texto compacto, uma linha "papel: conteúdo" por mensagem, para prompts
+    de texto livre. A janela já vem limitada (Config.HISTORY_MAX_MESSAGES) pelo
+    ia_processor; aqui só evitamos o repr dos documentos do MongoDB (_id, datas...).
+    """
+    return "\n".join(f"{msg.get('role')}: {msg.get('content') or ''}" for msg in history)
+
+def _truncate_document(content: str, max_chars: int) -> str:
+    """
+    Corta o conteúdo em até `max_chars` caracteres, terminando na última quebra de
+    linha dentro do limite (quando houver uma na segunda metade), para não entregar
+    ao LLM uma linha de tabela ou frase pela metade.
+    """
+    if len(content) <= max_chars:
+        return content
+    corte = content.rfind("\n", max_chars // 2, max_chars)
+    return content[:corte if corte != -1 else max_chars]
+
 def _get_template_name_from_state(state: GraphState) -> str | None:
     """Extrai o nome do arquivo do template do prompt do usuário."""
-    match = re.search(r"['\"]?([\w\d_\-]+\.docx?)['\"]?", state["prompt"], re.IGNORECASE)
+    match = _TEMPLATE_NAME_RE.search(state["prompt"])
     return match.group(1) if match else None
 
 # --- Implementação dos Nós ---
@@ -133,107 +278,17 @@ def fill_template_flow_node(state: GraphState) -> Dict[str, Any]:
         return {"generation": {}, "required_fields": [], "suggested_filename": suggested_filename}
 
     # --- PROMPT DE EXTRAÇÃO E GERAÇÃO (VERSÃO ESPECIALISTA v2) ---
-    prompt_template = f"""
-    **PERSONA:** Você é um Redator Técnico e Analista de Dados. Sua função é preencher uma estrutura JSON para um relatório técnico com base em uma solicitação do usuário. Você é capaz tanto de extrair informações quanto de gerar conteúdo plausível quando necessário.
-
-    **CONTEXTO:**
-    - Solicitação do Usuário: "{topic}"
-    - Histórico da Conversa: {state['conversation_history']}
-    - Template Alvo: '{template_name}'
-    - Estrutura de Dados Requerida (Chaves do JSON): {required_fields}
-    - Desses campos, os seguintes são LISTAS (para loops): {collections_fields}
-
-    **TAREFA:** Preencha o JSON abaixo. Você deve seguir a "Lógica de Preenchimento Híbrida e Sugerir um nome de arquivo (`suggested_filename`) descritivo, em `snake_case`, terminando em `.docx`. O nome deve refletir o tópico principal do documento.".
-
-    **LÓGICA DE PREENCHIMENTO HÍBRIDA (REGRAS CRÍTICAS):**
-
-    1.  **EXTRAIR PRIMEIRO:** Sempre priorize as informações fornecidas pelo usuário no histórico ou na solicitação.
-    2.  **GERAR DEPOIS (PARA CAMPOS DE TEXTO):** Se a informação para um campo de texto (`titulo_documento`, `subtitulo_documento`, `sumario_documento`, `secao.titulo`, `secao.conteudo`, `texto_conclusao`) NÃO for fornecida, **VOCÊ DEVE GERAR** um conteúdo apropriado e profissional com base no tópico principal ("{topic}").
-    3.  **NÃO GERAR DADOS TABULARES:** Para campos de dados estruturados como `dados_coletados`, se a informação não for fornecida, o valor DEVE ser uma lista vazia `[]`. **NÃO INVENTE DADOS NUMÉRICOS OU DE MEDIÇÃO.**
-    4.  **LISTAS VAZIAS:** Para campos de lista como `secoes`, se o usuário não especificar nenhuma seção, mas o tópico for complexo, sinta-se à vontade para gerar 2 ou 3 seções relevantes (ex: "Introdução", "Desenvolvimento", "Conclusão"). Se o tópico for muito simples, use uma lista vazia `[]`.
-    5.  **DATAS:** Para campos de data como `data_documento`, use a data atual no formato 'DD de MMMM de AAAA' se não for especificada.
-
-    **EXEMPLO DE USO COM O TEMPLATE 'TEMPLATE_TPF.docx':**
-
-    *   **Cenário 1 (Prompt Vago):**
-        *   Solicitação do Usuário: "Crie um relatório para a Global Corp sobre inspeção de drones em linhas de transmissão."
-        *   Seu Raciocínio: "O usuário deu um bom tópico, mas nenhum detalhe. Vou gerar o conteúdo."
-        *   Saída JSON Esperada (Exemplo):
-          ```json
-          {{
-            "titulo_documento": "Relatório de Inspeção de Linhas de Transmissão com Drones",
-            "subtitulo_documento": "Análise para Cliente: Global Corp",
-            "data_documento": "31 de Outubro de 2025",
-            "sumario_documento": "Este documento apresenta os resultados da inspeção aérea realizada com VANTs (Veículos Aéreos Não Tripulados) nas linhas de transmissão designadas, detalhando as anomalias encontradas e as recomendações técnicas.",
-            "secoes": [
-              {{
-                "titulo": "1. Introdução",
-                "conteudo": "A inspeção aérea com drones representa uma evolução na manutenção preditiva de ativos elétricos, permitindo a identificação de defeitos com maior segurança e eficiência...",
-                "subsecoes": []
-              }},
-              {{
-                "titulo": "2. Metodologia Aplicada",
-                "conteudo": "Foram utilizados drones do modelo DJI Matrice 300 RTK equipados com sensores térmicos e RGB de alta resolução...",
-                "subsecoes": []
-              }}
-            ],
-            "dados_coletados": [],
-            "texto_conclusao": "A inspeção revelou-se eficaz, e recomenda-se a atuação das equipes de manutenção nos pontos críticos identificados para garantir a integridade do sistema."
-          }}
-          ```
-
-    *   **Cenário 2 (Prompt com Detalhes):**
-        *   Solicitação: "Use o TEMPLATE_TPF.docx. Título: Relatório de Campo. Seção 1: 'Visita Técnica', conteúdo: 'A visita ocorreu na segunda-feira'. Dados: Local 'Torre 15', Med_A '35.2', Med_B '40.1'."
-        *   Seu Raciocínio: "O usuário deu detalhes específicos. Vou usá-los e gerar o resto."
-        *   Saída JSON Esperada (Exemplo):
-          ```json
-          {{
-            "titulo_documento": "Relatório de Campo",
-            "subtitulo_documento": "Análise Preliminar",
-            "data_documento": "31 de Outubro de 2025",
-            "sumario_documento": "Este documento detalha os achados da visita técnica de campo, incluindo medições iniciais.",
-            "secoes": [
-              {{
-                "titulo": "Visita Técnica",
-                "conteudo": "A visita ocorreu na segunda-feira.",
-                "subsecoes": []
-              }}
-            ],
-            "dados_coletados": [
-              {{
-                "local": "Torre 15",
-                "med_A": "35.2",
-                "med_B": "40.1"
-              }}
-            ],
-            "texto_conclusao": "As medições iniciais indicam a necessidade de uma análise mais aprofundada."
-          }}
-          ```
-
-    **EXEMPLO DE RACIOCÍNIO E SAÍDA:**
-    - Solicitação do Usuário: "Crie um relatório para a Global Corp sobre inspeção de drones."
-    - Seu Raciocínio: "O tópico é 'inspeção de drones para a Global Corp'. Um bom nome de arquivo seria 'relatorio_inspecao_drones_global_corp.docx'. Vou gerar o conteúdo para os campos de texto e deixar os dados tabulares vazios."
-    - Saída JSON Correta (Exemplo):
-      ```json
-      {{
-        "suggested_filename": "relatorio_inspecao_drones_global_corp.docx",
-        "context": {{
-          "titulo_documento": "Relatório de Inspeção com Drones",
-          "subtitulo_documento": "Cliente: Global Corp",
-          "data_documento": "31 de Outubro de 2025",
-          "sumario_documento": "Este documento detalha os resultados da inspeção...",
-          "secoes": [],
-          "dados_coletados": [],
-          "texto_conclusao": "A inspeção foi um sucesso."
-        }}
-      }}
-      ```
-
-    **FORMATO DE SAÍDA OBRIGATÓRIO:** Responda APENAS com o bloco JSON estruturado com as chaves 'suggested_filename' e 'context'.
-    """
+    # Texto em prompts/fill_template.tmpl: prefixo estático primeiro; o contexto
+    # específico desta requisição vai nos campos $ do final.
+    prompt_template = _FILL_TEMPLATE_PROMPT.substitute(
+        topic=topic,
+        history=_format_history_text(state['conversation_history']),
+        template_name=template_name,
+        required_fields=required_fields,
+        collections_fields=collections_fields,
+    )
     
-    parser = PydanticOutputParser(pydantic_object=TemplateOutput)
-    chain = llm | parser
+    chain = json_llm | _TEMPLATE_PARSER
     
     try:
         # A saída do LLM agora será um objeto Pydantic TemplateOutput
@@ -279,47 +334,21 @@ def read_document_flow_node(state: GraphState) -> Dict[str, Any]:
 
     # --- INÍCIO DA LÓGICA DE PROMPT DINÂMICO ---
     
-    # 2. Define a Persona e Instruções Específicas com base no tipo de conteúdo
-    if content_type in ["excel", "csv"]:
-        persona_and_instructions = """
-        **PERSONA:** Você é um Analista de Dados especialista em interpretar dados tabulares apresentados em formato de texto.
-        
-        **INSTRUÇÕES ADICIONAIS:** A "Fonte de Verdade" abaixo é uma tabela. Analise sua estrutura de colunas e linhas para responder à pergunta. Você tem permissão para fazer inferências, raciocinar e executar cálculos simples (somas, contagens, encontrar valores máximos/mínimos) com base nos dados da tabela para chegar à resposta correta.
-        """
-    elif content_type == "json":
-        persona_and_instructions = """
-        **PERSONA:** Você é um Engenheiro de Software especialista em estruturas de dados.
-        
-        **INSTRUÇÕES ADICIONAIS:** A "Fonte de Verdade" é um documento JSON. Navegue pela estrutura de chaves, valores, objetos e listas para encontrar a informação solicitada.
-        """
-    else:  # Para 'docx', 'pdf', 'txt' e outros tipos de texto puro
-        persona_and_instructions = """
-        **PERSONA:** Você é um Assistente de Pesquisa especialista em análise textual.
-        
-        **INSTRUÇÕES ADICIONAIS:** Leia e interprete o texto a seguir para encontrar a resposta para a pergunta do usuário.
-        """
-
-    # 3. Monta o prompt final combinando as partes
-    base_prompt_template = """
-    **CONTEXTO:**
-    - Pergunta do Usuário: '{question}'
-    - Conteúdo do Documento Anexado (Fonte de Verdade):
-    ---
-    {file_content}
-    ---
-
-    **TAREFA:** Com base **EXCLUSIVAMENTE** na "Fonte de Verdade" acima, responda à pergunta do usuário.
-
-    **PROTOCOLO DE RESPOSTA (REGRAS CRÍTICAS):**
-    1.  NÃO utilize conhecimento externo ou informações da internet.
-    2.  Se a resposta não puder ser encontrada ou inferida a partir dos dados do documento, sua única resposta permitida é: "Com base na análise do documento, não encontrei uma resposta para a sua pergunta."
-    3.  Seja direto e preciso em sua resposta. Forneça o resultado final sem explicações excessivas sobre como você chegou a ele, a menos que a pergunta peça isso.
-    """
-
-    full_prompt = persona_and_instructions + base_prompt_template
-    
-    # Formata o prompt com os dados reais, limitando o tamanho do conteúdo para evitar exceder limites de token
-    final_prompt_text = full_prompt.format(question=question, file_content=file_content[:15000])
+    # 2. Escolhe o prefixo estático (persona + protocolo) pelo tipo de conteúdo
+    # e monta o prompt final com a pergunta e o documento no final.
+    prefix = _PREFIX_SUMMARIZE.get(content_type, _PREFIX_SUMMARIZE["text"])
+
+    # Limita o tamanho do conteúdo para evitar exceder limites de token
+    file_content = _truncate_document(file_content, Config.DOCUMENT_CONTEXT_MAX_CHARS)
+    final_prompt_text = f"""{prefix}
+
+**CONTEXTO:**
+- Pergunta do Usuário: '{question}'
+- Conteúdo do Documento Anexado (Fonte de Verdade):
+---
+{file_content}
+---
+"""
     
     # 4. Usar o LLM para responder com base no prompt contextualizado
     response = llm.invoke(final_prompt_text)
@@ -328,8 +357,8 @@ def read_document_flow_node(state: GraphState) -> Dict[str, Any]:
 def create_document_flow_node(state: GraphState) -> Dict[str, Any]:
     """
     Executa o fluxo de criação de documentos com uma abordagem robusta de "Separação de Responsabilidades":
-    1. Gera o conteúdo em Markdown (ou texto tabular) em uma chamada de LLM.
-    2. Gera o nome do arquivo em outra chamada de LLM (executado em paralelo).
+    1. Gera o conteúdo em Markdown (ou texto tabular) em uma única chamada de LLM.
+    2. Deriva o nome do arquivo do tópico, de forma determinística, em Python.
     3. Combina os resultados em Python para a conversão e salvamento.
     """
     logger.info("Executando create_document_flow_node (com Separação de Responsabilidades)", conversation_id=state["conversation_id"])
@@ -341,58 +370,13 @@ def create_document_flow_node(state: GraphState) -> Dict[str, Any]:
 
     try:
         # TAREFA 1: CADEIA PARA GERAR APENAS O CONTEÚDO
-        content_prompt = ChatPromptTemplate.from_template(
-            """
-            **PERSONA:** Você é um Redator Especialista que estrutura todo o seu conteúdo usando Markdown para garantir uma formatação rica.
-            
-            **TAREFA:** Escreva um conteúdo textual completo e detalhado sobre o tópico: "{topic}".
-            
-            **REGRAS DE FORMATAÇÃO DO CONTEÚDO:**
-            - Se o formato de destino final for `docx` ou `pdf`, VOCÊ DEVE USAR SINTAXE MARKDOWN (títulos com '#', negrito com '**', listas com '-',  `---` para criar linhas de separação, `| Cabeçalho |` ... para criar tabelas simples, ``` para blocos de código e `código inline` etc.).
-            - Se o formato de destino final for `xlsx`, sua saída deve ser texto tabular (cabeçalho na primeira linha, colunas separadas por ';', e `\\n` para novas linhas).
-            
-            **IMPORTANTE:** Sua resposta deve conter APENAS o conteúdo bruto, sem nenhum comentário ou texto introdutório.
-            """
-        )
-        content_chain = content_prompt | llm | StrOutputParser()
-
-        # TAREFA 2: CADEIA PARA GERAR APENAS O NOME DO ARQUIVO
-        filename_prompt = ChatPromptTemplate.from_template(
-            """
-            **PERSONA:** Você é um assistente de arquivamento de IA.
-            
-            **TAREFA:** Com base no tópico a seguir, sugira um nome de arquivo curto, descritivo e em `snake_case`.
-            
-            **REGRAS:**
-            1. O nome do arquivo DEVE ter a extensão `.{file_type}`.
-            2. A resposta deve conter APENAS o nome do arquivo e nada mais.
-            
-            **TÓPICO:** "{topic}"
-            """
-        )
-        filename_chain = filename_prompt | llm | StrOutputParser()
-
-        # EXECUTAR AMBAS AS TAREFAS EM PARALELO PARA EFICIÊNCIA
-        # O resultado será um dicionário como {'content': '...', 'suggested_filename': '...'}
-        chain = RunnableParallel(
-            content=content_chain,
-            suggested_filename=filename_chain,
-        )
-        
-        # Invoca a cadeia paralela
-        generation_result = chain.invoke({"topic": topic, "file_type": file_type})
-        
-        generated_content = generation_result["content"]
-        suggested_filename = generation_result["suggested_filename"].strip().replace(" ", "_") # Limpeza extra
-
-        # Validação para garantir que o nome do arquivo está limpo e com a extensão correta
-        if not suggested_filename.endswith(f'.{file_type}'):
-             base_name = ".".join(suggested_filename.split('.')[:-1]) or suggested_filename
-             suggested_filename = f"{base_name}.{file_type}"
-
+        content_chain = _CONTENT_PROMPT | llm | _STR_PARSER
+        generated_content = content_chain.invoke({"topic": topic})
 
+        # TAREFA 2: O NOME DO ARQUIVO É DERIVADO DO TÓPICO EM PYTHON (sem LLM)
+        suggested_filename = _slugify_filename(topic, file_type)
     except Exception as e:
-        logger.error(f"Falha ao gerar conteúdo ou nome de arquivo do LLM.", error=str(e))
+        logger.error("Falha ao gerar o conteúdo do documento pelo LLM.", error=str(e))
         return { "final_response": "Tive um problema ao gerar o conteúdo para o seu documento." }
 
     # --- FIM DA NOVA ARQUITETURA DE GERAÇÃO ---
@@ -406,15 +390,20 @@ def create_document_flow_node(state: GraphState) -> Dict[str, Any]:
         elif file_type == 'pdf':
             file_stream = convert_markdown_to_pdf_stream(generated_content)
         elif file_type == 'xlsx':
-            topicos = [line for line in generated_content.split('\n') if line]
+            # Iterador preguiçoso: criar_xlsx_stream consome qualquer iterável, então
+            # não precisamos de uma segunda lista só com as linhas não vazias.
+            topicos = filter(None, generated_content.splitlines())
             file_stream = criar_xlsx_stream(topicos, filename=suggested_filename)
         
         if file_stream:
-            save_result = save_file_tool.invoke({
-                "filename": suggested_filename,
-                "content_stream": file_stream.getvalue(),
-                "owner_id": state["user_id"]
-            })
+            # Passa o próprio stream: o GridFS o lê em chunks, sem copiar o arquivo
+            # inteiro para um `bytes` intermediário.
+            with file_stream:
+                save_result = save_file_tool.invoke({
+                    "filename": suggested_filename,
+                    "content_stream": file_stream,
+                    "owner_id": state["user_id"]
+                })
             return {"tool_output": save_result}
         else:
             raise ValueError(f"Tipo de arquivo não suportado para geração: {file_type}")
@@ -433,8 +422,9 @@ def general_chat_flow_node(state: GraphState) -> Dict[str, Any]:
     # Inspeciona o pedido original do usuário que foi passado pelo roteador.
     user_request = state["routed_tool_call"]["args"].get("user_request", "").lower()
     
-    # Verifica por palavras-chave relacionadas a templates.
-    if any(word in user_request for word in ["template", "templates", "modelo", "modelos"]):
+    # Verifica por palavras-chave relacionadas a templates (tokeniza uma vez só).
+    tokens = frozenset(_WORD_RE.findall(user_request))
+    if tokens & _TEMPLATE_KEYWORDS:
         logger.info("Detectada intenção de listar templates dentro do chat geral.")
         lister_result = template_lister_tool.invoke({})
         templates = lister_result.get("data", {}).get("templates", [])
@@ -444,26 +434,18 @@ def general_chat_flow_node(state: GraphState) -> Dict[str, Any]:
             response_text = "No momento, não há templates disponíveis no sistema."
         return {"final_response": response_text}
 
-    # Para outras conversas, apenas chamamos o LLM com o histórico
-    prompt = f"""
-    **PERSONA:** Você é o TPF-AI, um assistente de IA amigável, prestativo e profissional.
-
-    **CAPACIDADES:** Você pode conversar sobre diversos tópicos, ajudar com tarefas criativas (escrever poemas, resumos), responder a perguntas gerais e, o mais importante, você pode criar e manipular documentos.
-
-    **CONTEXTO DA CONVERSA:**
-    {state['conversation_history']}
-
-    **TAREFA:** Responda à última mensagem do usuário (`{state['prompt']}`) de forma útil e engajadora, mantendo o contexto da conversa.
-
-    **DIRETRIZES DE COMUNICAÇÃO:**
-    - Seja sempre educado e claro.
-    - Se você não souber uma resposta, diga que não sabe em vez de inventar.
-    - Se a pergunta do usuário for ambígua, faça uma pergunta de esclarecimento para entender melhor a necessidade dele.
-    - Mantenha as respostas relativamente concisas.
-
-    **FORMATO DE SAÍDA:** Uma resposta em texto amigável.
-    """
-    response = llm.invoke(prompt)
+    # Mensagens triviais (saudações, agradecimentos) têm resposta pronta, sem LLM.
+    reply = canned_reply(state["prompt"])
+    if reply:
+        return {"final_response": reply}
+
+    # Para outras conversas, chamamos o LLM com o histórico como mensagens estruturadas
+    # (e não o repr da lista de documentos do MongoDB, com _id, timestamps etc.).
+    messages = _CHAT_PROMPT.invoke({
+        "history": _history_to_messages(state["conversation_history"], state["prompt"]),
+        "prompt": state["prompt"],
+    })
+    response = llm.invoke(messages)
     return {"final_response": response.content}
 
 def final_response_node(state: GraphState) -> Dict[str, Any]:
@@ -515,19 +497,14 @@ def validate_and_clarify_node(state: GraphState) -> Dict[str, Any]:
         return {"final_response": "Desculpe, ocorreu um erro interno ao preparar os dados do seu documento."}
 
     required_fields = state.get("required_fields", [])
+    total_fields = len(required_fields)
     
-    null_or_empty_count = 0
-    if required_fields: # Evita divisão por zero
-        for key in required_fields:
-            value = generated_json.get(key)
-            if value is None or (isinstance(value, list) and not value):
-                null_or_empty_count += 1
+    # Campos ausentes ou vazios (None, "", [] e {} são todos falsy), em um único passe.
+    missing_fields = [key for key in required_fields if not generated_json.get(key)]
             
-    if len(required_fields) > 2 and null_or_empty_count > len(required_fields) / 2:
+    if total_fields > 2 and len(missing_fields) > total_fields / 2:
         logger.warning("JSON gerado está muito vazio. Pedindo esclarecimento ao usuário.")
         
-        missing_fields = [key for key in required_fields if generated_json.get(key) is None]
-        
         # Usa o LLM para formular uma pergunta amigável
         prompt = f"""
         **PERSONA:** Você é um assistente de IA proativo.
@@ -22,6 +22,7 @@ anterior por uma única chamada a um sistema determinístico e com estado.
 from bson import ObjectId
 from datetime import datetime
 from src.db.mongo import get_db
+from src.config import Config
 from src.utils.observability import log_with_context, track_performance, correlation_ctx
 
 # Importa o grafo compilado, que é o coração da nossa nova lógica de IA
@@ -57,12 +58,22 @@ def processar_solicitacao_ia(message_id: str) -> str:
         conversation_id = current_message["conversation_id"]
         user_id = current_message["user_id"]
         
-        # O histórico é essencial para o contexto do LLM
-        history_cursor = db.messages.find({"conversation_id": conversation_id}).sort("timestamp", 1)
+        # O histórico é essencial para o contexto do LLM, mas só as mensagens mais
+        # recentes importam: limitamos a janela para que o prompt (e o volume
+        # trazido do banco) não cresça indefinidamente com conversas longas.
+        # Buscamos em ordem decrescente com limite e invertemos para ficar cronológico.
+        # Obs.: sem um índice em (conversation_id, timestamp) o MongoDB ainda varre
+        # e ordena todas as mensagens da conversa; o limite reduz só o retorno.
+        history_cursor = (
+            db.messages.find({"conversation_id": conversation_id})
+            .sort("timestamp", -1)
+            .limit(Config.HISTORY_MAX_MESSAGES)
+        )
         # Converte o cursor para uma lista e ObjectIds para strings para serialização
         conversation_history = [
             {**msg, "_id": str(msg["_id"])} for msg in history_cursor
         ]
+        conversation_history.reverse()
 
         # --- ETAPA 2: Montar o Estado Inicial para o Grafo ---
         # Este dicionário deve corresponder exatamente à estrutura definida em `GraphState`.
@@ -85,20 +96,21 @@ def processar_solicitacao_ia(message_id: str) -> str:
         final_response_content = final_state.get("final_response", "Desculpe, ocorreu um erro e não consegui gerar uma resposta.")
         generated_doc_id = final_state.get("generated_document_id")
 
+        now = datetime.utcnow()
         assistant_message = {
             "conversation_id": conversation_id,
             "role": "assistant",
             "content": final_response_content,
             "generated_document_id": ObjectId(generated_doc_id) if generated_doc_id else None,
             "user_id": user_id,
-            "timestamp": datetime.utcnow(),
+            "timestamp": now,
         }
         db.messages.insert_one(assistant_message)
         
         # Atualiza a data da última modificação da conversa
         db.conversations.update_one(
             {"_id": conversation_id},
-            {"$set": {"last_updated_at": datetime.utcnow()}}
+            {"$set": {"last_updated_at": now}}
         )
         
         logger.info("Orquestração com LangGraph concluída com sucesso.", message_id=message_id)
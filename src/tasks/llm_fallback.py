@@ -6,26 +6,47 @@ from langchain_core.messages import BaseMessage
 from src.config import Config
 from src.utils.observability import log_with_context
 import google.api_core.exceptions
-from typing import Any, List
+import threading
+from functools import lru_cache
+from typing import Any, List, Optional
 
 logger = log_with_context(component="LLMFallback")
 
+# Limita as chamadas simultâneas ao Gemini em todo o processo. Com o gunicorn em
+# gthread, cada thread bloqueia na sua própria chamada; o semáforo evita que um
+# pico de requisições estoure o rate limit da API (erros 429 em cascata).
+_llm_semaphore = threading.BoundedSemaphore(Config.LLM_MAX_CONCURRENCY)
+
+@lru_cache(maxsize=32)
+def get_chat_model(model: str, temperature: float, response_mime_type: Optional[str] = None) -> ChatGoogleGenerativeAI:
+    """
+    Retorna o cliente do Gemini para (modelo, temperatura, formato de resposta),
+    criando-o uma única vez por processo. Todos os FallbackLLM com a mesma configuração
+    compartilham o mesmo cliente (e suas conexões HTTP), em vez de reinicializar o SDK.
+
+    Com `response_mime_type="application/json"` o Gemini é restrito a emitir JSON
+    válido já na decodificação (sem cercas de markdown nem texto extra).
+    """
+    return ChatGoogleGenerativeAI(
+        model=model,
+        google_api_key=Config.GOOGLE_API_KEY,
+        convert_system_message_to_human=True,
+        temperature=temperature,
+        response_mime_type=response_mime_type,
+        # Uma chamada travada não pode prender a thread (e o semáforo) indefinidamente;
+        # o DeadlineExceeded resultante faz o FallbackLLM passar ao próximo modelo.
+        timeout=Config.LLM_TIMEOUT_SECONDS
+    )
+
 class FallbackLLM(Runnable):
     """
     Um Runnable customizado que tenta uma lista de modelos de LLM em sequência.
     Esta versão aprimorada suporta a delegação de métodos como `bind_tools`.
     """
-    def __init__(self, temperature: float = 0.7):
-        # Cria as instâncias dos LLMs, mas não as armazena diretamente em self.llms
+    def __init__(self, temperature: float = 0.7, response_mime_type: Optional[str] = None):
+        # Obtém as instâncias (compartilhadas) dos LLMs, mas não as armazena diretamente em self.llms
         self.model_names = Config.LLM_MODEL_LIST
-        self._llms = [
-            ChatGoogleGenerativeAI(
-                model=name,
-                google_api_key=Config.GOOGLE_API_KEY,
-                convert_system_message_to_human=True,
-                temperature=temperature
-            ) for name in self.model_names
-        ]
+        self._llms = [get_chat_model(name, temperature, response_mime_type) for name in self.model_names]
         
         if not self._llms:
             raise ValueError("A lista de modelos LLM não pode estar vazia.")
@@ -61,7 +82,8 @@ class FallbackLLM(Runnable):
             model_name = self.model_names[i]
             try:
                 logger.info(f"Tentando invocar o modelo: {model_name}")
-                result = runnable.invoke(messages, config=config, **kwargs)
+                with _llm_semaphore:
+                    result = runnable.invoke(messages, config=config, **kwargs)
                 
                 # Verificação de resposta bloqueada por segurança
                 finish_reason = getattr(result, 'response_metadata', {}).get("finish_reason", "UNSPECIFIED")
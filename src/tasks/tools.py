@@ -19,13 +19,16 @@ garantindo uma comunicação previsível entre as ferramentas e os nós do grafo
 """
 
 import io
+import os
 import re
+import threading
 from datetime import datetime
 from typing import Dict, Any, Optional
 
 import pandas as pd
 import fitz
-import json
+import orjson
+from cachetools import LRUCache, TTLCache
 from bson import ObjectId
 from bson.errors import InvalidId
 from docx import Document
@@ -35,6 +38,7 @@ from pydantic import BaseModel, Field
 from langchain_core.tools import tool
 
 from src.db.mongo import get_db, get_gridfs
+from src.db.cache import invalidate_documents
 from src.models.tool_response import ToolResponse, ErrorCodes
 from src.tasks.file_generators import criar_xlsx_stream
 from src.utils.docx_placeholders import extract_placeholders_from_docx_bytes
@@ -42,6 +46,9 @@ from src.utils.observability import log_with_context, track_performance
 
 logger = log_with_context(component="Tools-LangChain")
 
+# Extrai o nome do campo da mensagem de UndefinedError do Jinja
+_UNDEFINED_FIELD_RE = re.compile(r"'([a-zA-Z0-9_\.]+)'\s+is undefined")
+
 # --- Funções Helper (Reutilizadas da sua implementação original) ---
 
 def _to_objectid_if_possible(value: Any) -> Any:
@@ -52,6 +59,52 @@ def _to_objectid_if_possible(value: Any) -> Any:
     except (InvalidId, TypeError):
         return value
 
+# Placeholders extraídos de cada template, por gridfs_file_id. Um template
+# reenviado ganha um novo arquivo no GridFS (e um novo id), então a entrada
+# antiga simplesmente deixa de ser consultada.
+_placeholders_cache = LRUCache(maxsize=64)
+_placeholders_cache_lock = threading.Lock()
+
+def _template_placeholders(gridfs_id: Any, file_bytes: Optional[bytes] = None) -> Dict[str, Any]:
+    """
+    Retorna o resultado de `extract_placeholders_from_docx_bytes` para o template,
+    lendo o arquivo do GridFS (se `file_bytes` não for fornecido) apenas na primeira vez.
+    """
+    with _placeholders_cache_lock:
+        cached = _placeholders_cache.get(gridfs_id)
+    if cached is not None:
+        return cached
+
+    if file_bytes is None:
+        file_bytes = get_gridfs().get(gridfs_id).read()
+    placeholders_info = extract_placeholders_from_docx_bytes(file_bytes)
+    with _placeholders_cache_lock:
+        _placeholders_cache[gridfs_id] = placeholders_info
+    return placeholders_info
+
+# Nomes dos templates disponíveis. A coleção muda raramente (só pelo upload de
+# templates, que invalida a entrada neste processo); o TTL limita o atraso com
+# que os demais workers enxergam um template novo.
+_TEMPLATE_NAMES_KEY = "templates"
+_template_names_cache = TTLCache(maxsize=1, ttl=30)
+_template_names_cache_lock = threading.Lock()
+
+def _list_template_names() -> list:
+    with _template_names_cache_lock:
+        cached = _template_names_cache.get(_TEMPLATE_NAMES_KEY)
+    if cached is not None:
+        return list(cached)
+
+    nomes_templates = tuple(t["filename"] for t in get_db().templates.find({}, {"filename": 1, "_id": 0}))
+    with _template_names_cache_lock:
+        _template_names_cache[_TEMPLATE_NAMES_KEY] = nomes_templates
+    return list(nomes_templates)
+
+def invalidate_template_list() -> None:
+    """Descarta a lista de templates em cache (chamar após enviar um template)."""
+    with _template_names_cache_lock:
+        _template_names_cache.pop(_TEMPLATE_NAMES_KEY, None)
+
 def _normalizar_contexto(contexto: Any) -> Any:
     if isinstance(contexto, str):
         return contexto.strip()
@@ -83,6 +136,87 @@ class TemplateInspectorInput(BaseModel):
 class DatabaseQueryInput(BaseModel):
     document_id: str = Field(description="O ID do metadado do documento a ser consultado.")
 
+# ---------------- Leitores por Tipo de Arquivo ----------------
+# Cada leitor recebe os bytes do arquivo e o nome original, e devolve o dict do
+# ToolResponse. O `file_reader_tool` escolhe o leitor pela extensão em `_FILE_READERS`.
+
+def _read_docx(file_bytes: bytes, filename: str) -> Dict[str, Any]:
+    doc = Document(io.BytesIO(file_bytes))
+    full_text = "\n".join([para.text for para in doc.paragraphs])
+    return ToolResponse.success(message="Documento DOCX lido com sucesso", data={"filename": filename, "content": full_text, "content_type": "docx"}).to_dict()
+
+def _read_excel(file_bytes: bytes, filename: str) -> Dict[str, Any]:
+    df = pd.read_excel(io.BytesIO(file_bytes))
+    content_str = df.to_string(index=False)
+    return ToolResponse.success(message="Planilha Excel lida com sucesso", data={"filename": filename, "content": content_str, "content_type": "excel"}).to_dict()
+
+def _read_pdf(file_bytes: bytes, filename: str) -> Dict[str, Any]:
+    try:
+        with fitz.open(stream=file_bytes, filetype="pdf") as doc:
+            full_text = "".join(page.get_text() for page in doc)
+        logger.info(f"PDF '{filename}' lido com sucesso. Extraídos {len(full_text)} caracteres.")
+        return ToolResponse.success(message="Documento PDF lido com sucesso.", data={"filename": filename, "content": full_text, "content_type": "pdf"}).to_dict()
+    except Exception as e:
+        logger.error(f"Erro ao processar o arquivo PDF '{filename}'.", error=str(e))
+        return ToolResponse.error(message=f"Não foi possível ler o conteúdo do arquivo PDF. Ele pode estar corrompido ou ser baseado em imagem.", error_code=ErrorCodes.VALIDATION_ERROR).to_dict()
+
+def _read_txt(file_bytes: bytes, filename: str) -> Dict[str, Any]:
+    try:
+        full_text = file_bytes.decode('utf-8')
+        return ToolResponse.success(
+            message="Arquivo de texto (.txt) lido com sucesso.",
+            data={"filename": filename, "content": full_text, "content_type": "text/plain"}
+        ).to_dict()
+    except UnicodeDecodeError:
+        full_text = file_bytes.decode('latin-1')
+        return ToolResponse.success(
+            message="Arquivo de texto (.txt) lido com sucesso (usando codificação latin-1).",
+            data={"filename": filename, "content": full_text, "content_type": "text/plain"}
+        ).to_dict()
+
+def _read_csv(file_bytes: bytes, filename: str) -> Dict[str, Any]:
+    try:
+        df = pd.read_csv(io.BytesIO(file_bytes))
+        content_str = df.to_string(index=False)
+        return ToolResponse.success(
+            message="Arquivo CSV lido com sucesso.",
+            data={"filename": filename, "content": content_str, "content_type": "text/csv"}
+        ).to_dict()
+    except Exception as e:
+        logger.error(f"Erro ao processar o arquivo CSV '{filename}'.", error=str(e))
+        return ToolResponse.error(message=f"Não foi possível ler o conteúdo do arquivo CSV. Verifique se a formatação está correta.", error_code=ErrorCodes.VALIDATION_ERROR).to_dict()
+
+def _read_json(file_bytes: bytes, filename: str) -> Dict[str, Any]:
+    try:
+        # orjson lê os bytes direto (validando o UTF-8), sem decode intermediário.
+        json_data = orjson.loads(file_bytes)
+        # Converte o JSON de volta para uma string formatada (pretty-printed) para o LLM ler.
+        content_str = orjson.dumps(json_data, option=orjson.OPT_INDENT_2).decode()
+        return ToolResponse.success(
+            message="Arquivo JSON lido com sucesso.",
+            data={"filename": filename, "content": content_str, "content_type": "application/json"}
+        ).to_dict()
+    except (orjson.JSONDecodeError, orjson.JSONEncodeError) as e:
+        logger.error(f"Erro ao processar o arquivo JSON '{filename}'.", error=str(e))
+        return ToolResponse.error(message=f"Não foi possível ler o conteúdo do arquivo JSON. Verifique se o arquivo está bem formatado e com codificação UTF-8.", error_code=ErrorCodes.VALIDATION_ERROR).to_dict()
+
+_FILE_READERS = {
+    ".docx": _read_docx,
+    ".xlsx": _read_excel,
+    ".xls": _read_excel,
+    ".pdf": _read_pdf,
+    ".txt": _read_txt,
+    ".csv": _read_csv,
+    ".json": _read_json,
+}
+
+# Conteúdo já extraído de cada arquivo, por (gridfs_file_id, nome exibido). Arquivos
+# no GridFS são imutáveis, então a entrada nunca fica desatualizada; o TTL e o
+# tamanho só limitam a memória. Perguntas seguidas sobre o mesmo anexo deixam de
+# baixar e reprocessar o PDF/planilha a cada turno.
+_reader_cache = TTLCache(maxsize=32, ttl=600)
+_reader_cache_lock = threading.Lock()
+
 # ---------------- Implementação das Ferramentas como Funções Decoradas ----------------
 
 @tool(args_schema=FileReaderInput)
@@ -98,7 +232,7 @@ def file_reader_tool(document_id: str) -> Dict[str, Any]:
         if not isinstance(doc_oid, ObjectId):
             return ToolResponse.error(message=f"ID do documento '{document_id}' é inválido.", error_code=ErrorCodes.INVALID_OBJECT_ID).to_dict()
 
-        doc_meta = db.documents.find_one({"_id": doc_oid})
+        doc_meta = db.documents.find_one({"_id": doc_oid}, {"filename": 1, "gridfs_file_id": 1})
         if not doc_meta:
             return ToolResponse.error(message=f"Documento com ID '{document_id}' não encontrado.", error_code=ErrorCodes.DOCUMENT_NOT_FOUND).to_dict()
 
@@ -106,82 +240,24 @@ def file_reader_tool(document_id: str) -> Dict[str, Any]:
         if not gridfs_id:
             return ToolResponse.error(message="Metadado do documento não possui gridfs_file_id.", error_code=ErrorCodes.GRIDFS_ERROR).to_dict()
 
-        gridfs_file = fs.get(_to_objectid_if_possible(gridfs_id))
-        filename = doc_meta.get("filename", "").lower()
+        display_name = doc_meta.get("filename", "")
+        reader = _FILE_READERS.get(os.path.splitext(display_name.lower())[1])
+        if reader is None:
+            return ToolResponse.error(message=f"O arquivo '{display_name}' não é de um tipo suportado (DOCX, XLSX, PDF, TXT, CSV, JSON).", error_code=ErrorCodes.VALIDATION_ERROR).to_dict()
 
-        if filename.endswith(".docx"):
-            file_bytes = gridfs_file.read()
-            doc = Document(io.BytesIO(file_bytes))
-            full_text = "\n".join([para.text for para in doc.paragraphs])
-            return ToolResponse.success(message="Documento DOCX lido com sucesso", data={"filename": doc_meta.get("filename"), "content": full_text, "content_type": "docx"}).to_dict()
-        
-        elif filename.endswith((".xlsx", ".xls")):
-            file_bytes = gridfs_file.read()
-            df = pd.read_excel(io.BytesIO(file_bytes))
-            content_str = df.to_string(index=False)
-            return ToolResponse.success(message="Planilha Excel lida com sucesso", data={"filename": doc_meta.get("filename"), "content": content_str, "content_type": "excel"}).to_dict()
-        
-        elif filename.endswith(".pdf"):
-            try:
-                file_bytes = gridfs_file.read()
-                with fitz.open(stream=file_bytes, filetype="pdf") as doc:
-                    full_text = "".join(page.get_text() for page in doc)
-                logger.info(f"PDF '{filename}' lido com sucesso. Extraídos {len(full_text)} caracteres.")
-                return ToolResponse.success(message="Documento PDF lido com sucesso.", data={"filename": doc_meta.get("filename"), "content": full_text, "content_type": "pdf"}).to_dict()
-            except Exception as e:
-                logger.error(f"Erro ao processar o arquivo PDF '{filename}'.", error=str(e))
-                return ToolResponse.error(message=f"Não foi possível ler o conteúdo do arquivo PDF. Ele pode estar corrompido ou ser baseado em imagem.", error_code=ErrorCodes.VALIDATION_ERROR).to_dict()
-
-        # --- NOVA LÓGICA PARA TXT ---
-        elif filename.endswith(".txt"):
-            try:
-                file_bytes = gridfs_file.read()
-                full_text = file_bytes.decode('utf-8')
-                return ToolResponse.success(
-                    message="Arquivo de texto (.txt) lido com sucesso.",
-                    data={"filename": doc_meta.get("filename"), "content": full_text, "content_type": "text/plain"}
-                ).to_dict()
-            except UnicodeDecodeError:
-                # O fallback também precisa ler os bytes, então garantimos que ele tenha acesso
-                file_bytes = gridfs_file.read() if gridfs_file.tell() > 0 else file_bytes
-                full_text = file_bytes.decode('latin-1')
-                return ToolResponse.success(
-                    message="Arquivo de texto (.txt) lido com sucesso (usando codificação latin-1).",
-                    data={"filename": doc_meta.get("filename"), "content": full_text, "content_type": "text/plain"}
-                ).to_dict()
-        
-        # --- NOVA LÓGICA PARA CSV ---
-        elif filename.endswith(".csv"):
-            try:
-                file_bytes = gridfs_file.read()
-                df = pd.read_csv(io.BytesIO(file_bytes))
-                content_str = df.to_string(index=False)
-                return ToolResponse.success(
-                    message="Arquivo CSV lido com sucesso.",
-                    data={"filename": doc_meta.get("filename"), "content": content_str, "content_type": "text/csv"}
-                ).to_dict()
-            except Exception as e:
-                logger.error(f"Erro ao processar o arquivo CSV '{filename}'.", error=str(e))
-                return ToolResponse.error(message=f"Não foi possível ler o conteúdo do arquivo CSV. Verifique se a formatação está correta.", error_code=ErrorCodes.VALIDATION_ERROR).to_dict()
-
-        # --- NOVA LÓGICA PARA JSON ---
-        elif filename.endswith(".json"):
-            try:
-                file_bytes = gridfs_file.read()
-                full_text = file_bytes.decode('utf-8')
-                json_data = json.loads(full_text)
-                # Converte o JSON de volta para uma string formatada (pretty-printed) para o LLM ler.
-                content_str = json.dumps(json_data, indent=2, ensure_ascii=False)
-                return ToolResponse.success(
-                    message="Arquivo JSON lido com sucesso.",
-                    data={"filename": doc_meta.get("filename"), "content": content_str, "content_type": "application/json"}
-                ).to_dict()
-            except (UnicodeDecodeError, json.JSONDecodeError) as e:
-                logger.error(f"Erro ao processar o arquivo JSON '{filename}'.", error=str(e))
-                return ToolResponse.error(message=f"Não foi possível ler o conteúdo do arquivo JSON. Verifique se o arquivo está bem formatado e com codificação UTF-8.", error_code=ErrorCodes.VALIDATION_ERROR).to_dict()
-        
-        else:
-            return ToolResponse.error(message=f"O arquivo '{doc_meta.get('filename')}' não é de um tipo suportado (DOCX, XLSX, PDF, TXT, CSV, JSON).", error_code=ErrorCodes.VALIDATION_ERROR).to_dict()
+        cache_key = (gridfs_id, display_name)
+        with _reader_cache_lock:
+            cached = _reader_cache.get(cache_key)
+        if cached is not None:
+            return {**cached, "data": dict(cached["data"])}
+
+        gridfs_file = fs.get(_to_objectid_if_possible(gridfs_id))
+        result = reader(gridfs_file.read(), display_name)
+        if result.get("status") == "success":
+            with _reader_cache_lock:
+                _reader_cache[cache_key] = result
+            result = {**result, "data": dict(result["data"])}
+        return result
             
     except Exception as e:
         logger.exception("tool_error", tool="file_reader_tool", error=str(e))
@@ -203,7 +279,7 @@ def template_filler_tool(template_name: str, context: dict, owner_id: str, outpu
         if not isinstance(owner_oid, ObjectId):
             return ToolResponse.error(message=f"O owner_id '{owner_id}' fornecido não é válido.", error_code=ErrorCodes.INVALID_OBJECT_ID).to_dict()
 
-        template_meta = db.templates.find_one({"filename": template_name})
+        template_meta = db.templates.find_one({"filename": template_name}, {"gridfs_file_id": 1})
         if not template_meta:
             return ToolResponse.error(message=f"Template '{template_name}' não encontrado.", error_code=ErrorCodes.TEMPLATE_NOT_FOUND).to_dict()
 
@@ -218,8 +294,9 @@ def template_filler_tool(template_name: str, context: dict, owner_id: str, outpu
         # Antes de renderizar, garantimos que qualquer campo esperado como um loop (coleção)
         # que esteja nulo no JSON da IA seja convertido em uma lista vazia.
         
-        # 1. Inspeciona o template para descobrir quais chaves são para loops.
-        placeholders_info = extract_placeholders_from_docx_bytes(file_bytes)
+        # 1. Inspeciona o template para descobrir quais chaves são para loops
+        #    (normalmente já em cache: o fluxo de preenchimento inspecionou este template antes).
+        placeholders_info = _template_placeholders(gridfs_id, file_bytes)
         collections_expected = placeholders_info.get("collections", [])
         
         # 2. Normaliza e sanitiza o contexto recebido da IA.
@@ -244,7 +321,7 @@ def template_filler_tool(template_name: str, context: dict, owner_id: str, outpu
             final_doc_stream.seek(0)
         except jinja_exceptions.UndefinedError as ue:
             missing_msg = str(ue)
-            m = re.search(r"'([a-zA-Z0-9_\.]+)'\s+is undefined", missing_msg)
+            m = _UNDEFINED_FIELD_RE.search(missing_msg)
             missing_field = m.group(1) if m else None
             return ToolResponse.error(message="Campos necessários ausentes para renderizar o template.", error_code=ErrorCodes.VALIDATION_ERROR, data={"missing_fields": [missing_field] if missing_field else [], "detail": missing_msg}).to_dict()
         except Exception as e:
@@ -259,6 +336,7 @@ def template_filler_tool(template_name: str, context: dict, owner_id: str, outpu
         output_file_id = fs.put(final_doc_stream.getvalue(), filename=output_filename)
         output_doc_meta = {"filename": output_filename, "gridfs_file_id": output_file_id, "owner_id": owner_oid, "template_used": template_name, "created_at": datetime.utcnow()}
         result = db.documents.insert_one(output_doc_meta)
+        invalidate_documents(owner_id)
 
         return ToolResponse.success(message=f"Documento '{output_filename}' gerado com sucesso.", data={"document_id": str(result.inserted_id), "filename": output_filename, "template_used": template_name}).to_dict()
     except Exception as e:
@@ -302,9 +380,9 @@ def template_filler_tool(template_name: str, context: dict, owner_id: str, outpu
 def template_inspector_tool(template_name: str) -> Dict[str, Any]:
     """Lê um template .docx e extrai placeholders (variáveis e coleções) que ele espera."""
     logger.info("tool_executed", tool="template_inspector_tool", template_name=template_name)
-    db, fs = get_db(), get_gridfs()
+    db = get_db()
     try:
-        template_meta = db.templates.find_one({"filename": template_name})
+        template_meta = db.templates.find_one({"filename": template_name}, {"gridfs_file_id": 1})
         if not template_meta:
             return ToolResponse.error(message=f"Template '{template_name}' não encontrado.", error_code=ErrorCodes.TEMPLATE_NOT_FOUND, data={"searched_name": template_name}).to_dict()
 
@@ -312,16 +390,16 @@ def template_inspector_tool(template_name: str) -> Dict[str, Any]:
         if not gridfs_id:
             return ToolResponse.error(message="Template não tem gridfs_file_id.", error_code=ErrorCodes.GRIDFS_ERROR).to_dict()
 
-        file_bytes = fs.get(_to_objectid_if_possible(gridfs_id)).read()
-        placeholders_info = extract_placeholders_from_docx_bytes(file_bytes)
+        placeholders_info = _template_placeholders(_to_objectid_if_possible(gridfs_id))
 
+        # Cópias das listas: o resultado em cache é compartilhado entre requisições.
         return ToolResponse.success(
             message=f"Inspeção concluída para {template_name}",
             data={
                 "template_name": template_name,
-                "all_required": placeholders_info.get("all_required", []),
-                "collections": placeholders_info.get("collections", []),
-                "variables": placeholders_info.get("variables", []),
+                "all_required": list(placeholders_info.get("all_required", [])),
+                "collections": list(placeholders_info.get("collections", [])),
+                "variables": list(placeholders_info.get("variables", [])),
             }
         ).to_dict()
 
@@ -342,10 +420,8 @@ def template_inspector_tool(template_name: str) -> Dict[str, Any]:
 def template_lister_tool() -> Dict[str, Any]:
     """Obtém uma lista com os nomes de todos os templates disponíveis no sistema."""
     logger.info("tool_executed", tool="template_lister_tool")
-    db = get_db()
     try:
-        templates_cursor = db.templates.find({}, {"filename": 1, "_id": 0})
-        nomes_templates = [t["filename"] for t in templates_cursor]
+        nomes_templates = _list_template_names()
         return ToolResponse.success(message=f"Encontrados {len(nomes_templates)} templates no sistema.", data={"templates": nomes_templates}).to_dict()
     except Exception as e:
         logger.exception("tool_error", tool="template_lister_tool", error=str(e))
@@ -381,13 +457,15 @@ def database_query_tool(document_id: str) -> Dict[str, Any]:
 
 class SaveFileInput(BaseModel):
     filename: str = Field(description="Nome completo do arquivo a ser salvo, incluindo a extensão.")
-    content_stream: bytes = Field(description="O conteúdo do arquivo como um stream de bytes.")
+    # `Any`: aceita bytes ou um objeto file-like binário (BytesIO, arquivo temporário);
+    # o GridFS lê o stream em chunks, sem exigir uma cópia completa em memória.
+    content_stream: Any = Field(description="O conteúdo do arquivo: bytes ou um stream binário posicionado no início.")
     owner_id: str = Field(description="ID do usuário dono do novo documento.")
 
 @tool(args_schema=SaveFileInput)
 @track_performance
-def save_file_tool(filename: str, content_stream: bytes, owner_id: str) -> Dict[str, Any]:
-    """Salva um arquivo (fornecido como um stream de bytes) no sistema de armazenamento (GridFS)."""
+def save_file_tool(filename: str, content_stream: Any, owner_id: str) -> Dict[str, Any]:
+    """Salva um arquivo (fornecido como bytes ou como um stream binário) no sistema de armazenamento (GridFS)."""
     logger.info("tool_executed", tool="save_file_tool", filename=filename)
     db, fs = get_db(), get_gridfs()
     try:
@@ -404,6 +482,7 @@ def save_file_tool(filename: str, content_stream: bytes, owner_id: str) -> Dict[
             "created_at": datetime.utcnow()
         }
         result = db.documents.insert_one(output_doc_meta)
+        invalidate_documents(owner_id)
 
         return ToolResponse.success(
             message=f"Documento '{filename}' salvo com sucesso.",
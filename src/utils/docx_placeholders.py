@@ -13,12 +13,23 @@ DOCX_TEXT_PARTS = [
     'word/comments.xml',
 ]
 
+# Padrões Jinja compilados uma única vez, na importação do módulo.
+_FOR_RE = re.compile(r'\{%\s*for\s+([a-zA-Z_][\w]*)\s+in\s+([a-zA-Z_][\w]*)\s*%\}')
+_VAR_RE = re.compile(r'\{\{\s*([a-zA-Z_][\w\.]*)\s*(?:\|[^}]*)?\}\}')
+
+# Uma única alternação percorre o XML uma vez só (em vez de três varreduras).
+# `<w:t(?:\s[^>]*)?>` não casa com `<w:tab/>`, `<w:tc>` etc., que de outra
+# forma "engoliriam" o trecho até o próximo `</w:t>`.
+_XML_TEXT_RE = re.compile(
+    r"<w:t(?:\s[^>]*)?>(.*?)</w:t>"
+    r"|<w:instrText[^>]*>(.*?)</w:instrText>"
+    r"|<w:fldSimple[^>]*>(.*?)</w:fldSimple>",
+    re.DOTALL,
+)
+
 def _extract_tokens_from_xml(xml_text: str):
-    tokens = []
-    tokens.extend(re.findall(r"<w:t[^>]*>(.*?)</w:t>", xml_text, flags=re.DOTALL))
-    tokens.extend(re.findall(r"<w:instrText[^>]*>(.*?)</w:instrText>", xml_text, flags=re.DOTALL))
-    tokens.extend(re.findall(r"<w:fldSimple[^>]*>(.*?)</w:fldSimple>", xml_text, flags=re.DOTALL))
-    return [tok if tok is not None else "" for tok in tokens]
+    # Cada match preenche apenas um dos três grupos; os demais vêm como "".
+    return [t or i or f for t, i, f in _XML_TEXT_RE.findall(xml_text)]
 
 def extract_placeholders_from_docx_bytes(file_bytes: bytes):
     """
@@ -41,12 +52,12 @@ def extract_placeholders_from_docx_bytes(file_bytes: bytes):
     full_text = ''.join(all_tokens)
 
     # 1. Encontra todos os loops `for var in collection`
-    for_matches = re.findall(r'\{%\s*for\s+([a-zA-Z_][\w]*)\s+in\s+([a-zA-Z_][\w]*)\s*%\}', full_text)
+    for_matches = _FOR_RE.findall(full_text)
     loop_variables = {var for var, coll in for_matches}
     collections = {coll for var, coll in for_matches}
 
     # 2. Encontra todas as variáveis `{{ var }}` ou `{{ var.attr }}`
-    var_matches = re.findall(r'\{\{\s*([a-zA-Z_][\w\.]*)\s*(?:\|[^}]*)?\}\}', full_text)
+    var_matches = _VAR_RE.findall(full_text)
 
     # 3. Processa as variáveis encontradas
     simple_vars = set()
@@ -0,0 +1,54 @@
+# src/utils/json_provider.py
+
+"""
+Provider JSON da aplicação baseado em `orjson`.
+
+Substitui o `DefaultJSONProvider` do Flask (módulo `json` puro) por um encoder
+em C. Além de serializar dicts e listas bem mais rápido, ele converte `ObjectId`
+diretamente, o que dispensa os laços de `str(doc['_id'])` nas rotas de listagem.
+
+O formato de saída é mantido igual ao do provider padrão do Flask: datas no
+formato HTTP (RFC 822) e `Decimal`/`UUID` como string.
+"""
+
+import dataclasses
+import decimal
+import uuid
+from datetime import date
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+
+def _default(o: Any) -> Any:
+    """Converte os tipos que o orjson não serializa (ou que delegamos) nativamente."""
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, date):
+        return http_date(o)
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if dataclasses.is_dataclass(o):
+        return dataclasses.asdict(o)
+    if hasattr(o, "__html__"):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Provider JSON do Flask que usa `orjson` para codificar e decodificar."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        # Datas passam pelo `_default` para manter o formato HTTP do Flask.
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if kwargs.get("sort_keys", self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=kwargs.get("default", _default), option=option).decode()
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        return orjson.loads(s)